@@ -1,19 +1,92 @@
-from openai_module import generate_response
+import re
+import json
+import asyncio
+from llm_providers import get_llm_provider
+from llm_client import call_llm, call_llm_async, LLMRequestError
 from helpers import get_question_list
+from llm_cache import get_llm_cache, llm_cache_key
+from prompt_budget import count_tokens, compact_section_data
+from config import LLM_CONCURRENCY, LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_TOKENS, LLM_SECTION_TOKEN_BUDGET, LLM_LABEL_MAX_CHARS
+from config import LLM_BATCH_SIZE, LLM_BATCH_MAX_TOKENS
 
-def ask_ai(prompt: str) -> str:
+def ask_ai(prompt: str, use_cache: bool = True):
     """
-    Generic wrapper to call the active AI provider.
-    For now, it delegates to OpenAI. In the future,
-    swap out the import with another provider.
+    Generic wrapper to call the active AI provider (LLM_PROVIDER, see llm_providers.py).
+    Answers are reused from the LLM cache (see llm_cache.py) unless use_cache is False
+    or the provider keeps its own answers (recorder and replayer).
+    Requests wait their turn and are tried again when it makes sense (see llm_client.py).
+    Returns None if the LLM couldn't answer.
     """
+    provider = get_llm_provider()
+    use_cache = use_cache and provider.uses_cache
+    key = _cache_key(prompt)
+    if use_cache:
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            return cached
+
     try:
-        return generate_response(prompt)
-    except Exception as e:
-        return f"Failed to generate the response. Exception: {e}"
-    
-def get_report_building_prompt():
-    questions_text = get_question_list()
+        response = call_llm(lambda text, timeout: provider.generate(text, timeout=timeout), provider.retry_info, prompt)
+    except LLMRequestError as e:
+        print(f"Failed to generate the response. Reason: {e}")
+        return None
+
+    if use_cache:
+        get_llm_cache().put(key, response)
+    return response
+
+# This function names a prompt in the LLM cache, with the model settings it's sent with
+def _cache_key(prompt: str, max_tokens: int = LLM_MAX_TOKENS) -> str:
+    return llm_cache_key(prompt, LLM_MODEL, LLM_TEMPERATURE, max_tokens)
+
+# This function sends many prompts at the same time, at most "concurrency" waiting for an answer at once.
+# The answers come back in the same order as the prompts (None for the ones the LLM couldn't answer).
+# Cached answers are not asked again (unless use_cache is False).
+# With json_output, the answers must be JSON objects (the prompts have to ask for them too).
+def ask_ai_many(prompts: list, concurrency: int = LLM_CONCURRENCY, use_cache: bool = True,
+                max_tokens: int = LLM_MAX_TOKENS, json_output: bool = False) -> list:
+    use_cache = use_cache and get_llm_provider().uses_cache
+    answers = [None] * len(prompts)
+    keys = [_cache_key(prompt, max_tokens) for prompt in prompts]
+    if use_cache:
+        cache = get_llm_cache()
+        answers = [cache.get(key) for key in keys]
+
+    # Only the prompts without a cached answer go to the LLM
+    missing = [i for i, answer in enumerate(answers) if answer is None]
+    if missing:
+        responses = asyncio.run(_ask_ai_all([prompts[i] for i in missing], concurrency, use_cache, [keys[i] for i in missing],
+                                            max_tokens, json_output))
+        for i, response in zip(missing, responses):
+            answers[i] = response
+    return answers
+
+async def _ask_ai_all(prompts: list, concurrency: int, use_cache: bool, keys: list, max_tokens: int, json_output: bool) -> list:
+    provider = get_llm_provider()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async with provider.open_session(max(1, concurrency)) as session:
+
+        async def send(text, timeout):
+            return await provider.generate_async(session, text, max_tokens=max_tokens, timeout=timeout, json_output=json_output)
+
+        async def ask_one(prompt, key):
+            async with semaphore:
+                try:
+                    response = await call_llm_async(send, provider.retry_info, prompt, max_tokens=max_tokens)
+                except LLMRequestError as e:
+                    print(f"Failed to generate the response. Reason: {e}")
+                    return None
+
+            if use_cache:
+                get_llm_cache().put(key, response)
+            return response
+
+        return await asyncio.gather(*(ask_one(prompt, key) for prompt, key in zip(prompts, keys)))
+
+# "headers" are the questions of the sheet (see get_question_list)
+def get_report_building_prompt(headers: list = None):
+    questions_text = get_question_list(headers)
     return f"""
     Você é um analista de dados sênior, especialista em internacionalização do ensino superior.
     Sua tarefa é elaborar um roteiro de diagnóstico institucional para apoiar a inscrição de uma rede universitária no programa CAPES-Global.
@@ -31,7 +104,28 @@ def get_report_building_prompt():
     - Não responda às perguntas nem insira dados — apenas construa a estrutura detalhada do relatório.
     """
 
-def get_section_analyzer_prompt(section_name: str, data: dict) -> str:
+# This function builds the prompt that analyzes one section of the report.
+# If it would go over "budget" tokens (None means no limit), the data is made smaller first
+# (see compact_section_data): repeated options joined, long labels shortened, the smallest answers added up.
+def get_section_analyzer_prompt(section_name: str, data: dict, budget: int = LLM_SECTION_TOKEN_BUDGET) -> str:
+    return _fit_section_prompt(section_name, data, budget)[0]
+
+# This function gives back the prompt of one section and the (maybe smaller) data that went into it
+def _fit_section_prompt(section_name: str, data: dict, budget: int):
+    full_prompt = _section_analyzer_prompt(section_name, data)
+    if budget is None:
+        return full_prompt, data
+
+    # The data can use what the rest of the prompt leaves of the budget
+    data_budget = budget - count_tokens(_section_analyzer_prompt(section_name, {}))
+    compact = compact_section_data(data, data_budget, _format_section_data, LLM_LABEL_MAX_CHARS)
+    prompt = _section_analyzer_prompt(section_name, compact)
+
+    print(f"Section '{section_name}' prompt: {count_tokens(full_prompt)} -> {count_tokens(prompt)} tokens (budget {budget})")
+    return prompt, compact
+
+# This function writes the data of a section as lines of "- column | answer: percentage%"
+def _format_section_data(data: dict) -> str:
     lines = []
     for col, answers in data.items():
         if isinstance(answers, dict):
@@ -41,7 +135,10 @@ def get_section_analyzer_prompt(section_name: str, data: dict) -> str:
             # fallback if it's already numeric
             lines.append(f"- {col}: {answers:.1f}%")
 
-    data_str = "\n".join(lines)
+    return "\n".join(lines)
+
+def _section_analyzer_prompt(section_name: str, data: dict) -> str:
+    data_str = _format_section_data(data)
 
     return f"""
     Você é um analista de dados sênior, especialista em educação.
@@ -55,4 +152,93 @@ def get_section_analyzer_prompt(section_name: str, data: dict) -> str:
     - Comece direto, sem frases introdutórias como “os resultados mostram que...”.
     - Conecte os dados a implicações institucionais, oportunidades e desafios.
     - O texto deve ter entre 2 e 4 parágrafos.
-    """
\ No newline at end of file
+    """
+
+# This function writes the analyses of many report sections. "sections" is a list of (group label, section name, data).
+# Up to batch_size sections (the same section of several groups first) go in one request that asks for a JSON object
+# with one analysis per section; whatever is missing or invalid in the answer is asked again, one section per request.
+# Every analysis is cached as if it had been asked alone, so reruns never depend on how the sections were batched.
+# The analyses come back in the same order as the sections (None for the ones the LLM couldn't answer).
+def ask_ai_sections(sections: list, batch_size: int = LLM_BATCH_SIZE, concurrency: int = LLM_CONCURRENCY, use_cache: bool = True) -> list:
+    use_cache = use_cache and get_llm_provider().uses_cache
+    fitted = [_fit_section_prompt(section_name, data, LLM_SECTION_TOKEN_BUDGET) for _, section_name, data in sections]
+    prompts = [prompt for prompt, _ in fitted]
+    answers = [None] * len(sections)
+    if use_cache:
+        cache = get_llm_cache()
+        answers = [cache.get(_cache_key(prompt)) for prompt in prompts]
+
+    missing = [i for i, answer in enumerate(answers) if answer is None]
+    if batch_size > 1 and len(missing) > 1:
+        # The same section of several groups goes together, so the batches look alike
+        missing.sort(key=lambda i: sections[i][1])
+        batches = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+
+        batch_prompts = []
+        for batch in batches:
+            items = [(str(n), sections[i][0], sections[i][1], fitted[i][1]) for n, i in enumerate(batch, start=1)]
+            batch_prompts.append(_batch_analyzer_prompt(items))
+
+        # The JSON answers themselves are not cached: each analysis in them is, under its own prompt
+        responses = ask_ai_many(batch_prompts, concurrency, use_cache=False, max_tokens=LLM_BATCH_MAX_TOKENS, json_output=True)
+        for batch, response in zip(batches, responses):
+            analyses = _parse_batch_answer(response, [str(n) for n in range(1, len(batch) + 1)])
+            for n, i in enumerate(batch, start=1):
+                answers[i] = analyses.get(str(n))
+                if answers[i] is not None and use_cache:
+                    get_llm_cache().put(_cache_key(prompts[i]), answers[i])
+
+        still_missing = [i for i in missing if answers[i] is None]
+        print(f"Batched {len(missing)} sections into {len(batches)} requests; {len(still_missing)} asked again one by one")
+        missing = sorted(still_missing)
+
+    # One request per section for the rest
+    if missing:
+        for i, answer in zip(missing, ask_ai_many([prompts[i] for i in missing], concurrency, use_cache)):
+            answers[i] = answer
+    return answers
+
+# This function builds the prompt that analyzes several sections at once.
+# "items" is a list of (id, group label, section name, data); the answer must be {id: analysis}.
+def _batch_analyzer_prompt(items: list) -> str:
+    blocks = []
+    for item_id, group_label, section_name, data in items:
+        blocks.append(f'### Item "{item_id}": seção "{section_name}" do relatório de "{group_label}"\n{_format_section_data(data)}')
+    blocks_str = "\n\n".join(blocks)
+    example = json.dumps({item_id: "..." for item_id, _, _, _ in items[:2]}, ensure_ascii=False)
+
+    return f"""
+    Você é um analista de dados sênior, especialista em educação.
+    Sua tarefa é escrever a análise textual e interpretativa de cada item abaixo (uma seção do relatório
+    institucional de um grupo), com base nos dados do item (em porcentagens):
+
+{blocks_str}
+
+    Regras para cada análise:
+    - O texto deve ser formal, analítico e corrido (sem bullet points).
+    - Comece direto, sem frases introdutórias como “os resultados mostram que...”.
+    - Conecte os dados a implicações institucionais, oportunidades e desafios.
+    - O texto deve ter entre 2 e 4 parágrafos.
+    - Use apenas os dados do próprio item.
+
+    Responda SOMENTE com um objeto JSON, com uma chave para cada item (o número entre aspas) e a análise como texto,
+    por exemplo: {example}
+    """
+
+# This function reads the JSON answer of a batch and gives back {id: analysis} of the valid ones
+# (known id, non-empty text). A missing or broken answer gives back {}.
+def _parse_batch_answer(response, item_ids: list) -> dict:
+    if not response:
+        return {}
+
+    # Some models wrap the JSON in ```json ... ``` even when asked not to
+    text = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", response)
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+
+    return {item_id: parsed[item_id].strip() for item_id in item_ids
+            if isinstance(parsed.get(item_id), str) and parsed[item_id].strip()}
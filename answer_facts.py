@@ -0,0 +1,217 @@
+# This file builds ONE long table with every answer of the survey:
+# one line per (person, question, answer), instead of one column per question.
+# The text is cleaned and split only once, here, right after reading the file.
+# Everything after that (Excel sheets, charts, AI data) is counted from this table.
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype
+from config import MULTIPLE_SEPARATOR, QTYPE_CLOSED, QTYPE_MULTIPLE, QTYPE_OPEN, QTYPE_IGNORE
+from data_cleaning import clean_single_values, match_apply_dtype, expand_multiple, is_text_dtype
+from helpers import colnum_to_excel
+
+# This class holds the long table of answers and what we need to count it.
+#
+# table has one line per answer, with the columns:
+#   respondent -> the row of the person in the answer sheet (0, 1, 2...)
+#   column     -> the letter of the question (A, B, C...)
+#   qtype      -> the kind of question (FECHADA, MÚLTIPLA...)
+#   group      -> the group of the person (NaN if they don't belong to any)
+#   answer     -> the code of the answer; answer_values[letter][code] is the answer itself
+class AnswerFacts:
+
+    def __init__(self, table: pd.DataFrame, answer_values: dict, columns: list, control_map: dict,
+                 n_rows: int, groups: list, group_rows: np.ndarray, group_col_name=None, group_is_text: bool = False,
+                 row_groups: np.ndarray = None):
+        self.table = table
+        self.answer_values = answer_values
+        self.columns = columns
+        self.control_map = control_map
+        self.n_rows = n_rows
+        self.groups = groups
+        self.group_rows = group_rows
+        self.group_col_name = group_col_name
+        self.group_is_text = group_is_text
+
+        # The group (0, 1, 2...) of each person of the answer sheet, -1 if they have none
+        self.row_groups = row_groups if row_groups is not None else np.full(n_rows, -1, dtype=np.int64)
+
+        # Letters of the questions we counted, and where each one starts and ends in the table
+        self.letters = {col: colnum_to_excel(i) for i, col in enumerate(columns)}
+        codes = table["column"].cat.codes.to_numpy()
+        categories = list(table["column"].cat.categories)
+        starts = np.searchsorted(codes, np.arange(len(categories)), side="left")
+        ends = np.searchsorted(codes, np.arange(len(categories)), side="right")
+        self._slices = {letter: (s, e) for letter, s, e in zip(categories, starts, ends)}
+
+    # This function lists the questions we counted, in the order of the sheet
+    def counted_columns(self) -> list:
+        return [col for col in self.columns if self.letters[col] in self._slices]
+
+    # This function gives back {column: counts} for everyone together.
+    # "only" limits it to some of the questions (all of them if None).
+    def general_counts(self, only=None) -> dict:
+        result = {}
+        for col in self._wanted(only):
+            answers, _ = self._column(col)
+            multiple = self.control_map.get(col, QTYPE_CLOSED) == QTYPE_MULTIPLE
+
+            # Closed questions: did every person give a valid answer?
+            complete = None
+            if not multiple:
+                complete = np.array([len(answers) == self.n_rows])
+
+            counts = _count_slices(np.zeros(len(answers), dtype=np.int64), answers, self.answer_values[self.letters[col]], complete)
+            result[col] = counts.get(0, _empty_counts())
+        return result
+
+    # This function gives back, for each group (in the order of self.groups), {column: counts}.
+    # "only" limits it to some of the questions (all of them if None).
+    def group_counts(self, only=None) -> list:
+        result = [{} for _ in self.groups]
+        for col in self._wanted(only):
+            multiple = self.control_map.get(col, QTYPE_CLOSED) == QTYPE_MULTIPLE
+
+            # Text group names are cleaned before splitting the groups,
+            # so inside a group the group column only has the cleaned group name
+            if col == self.group_col_name and self.group_is_text:
+                for g, group in enumerate(self.groups):
+                    pieces = expand_multiple(pd.Series([group], dtype=object), sep=MULTIPLE_SEPARATOR) if multiple else pd.Series([group])
+                    result[g][col] = pieces.value_counts().rename(None) * self.group_rows[g] if len(pieces) else _empty_counts()
+                continue
+
+            answers, groups = self._column(col)
+            in_group = groups >= 0
+            answers, groups = answers[in_group], groups[in_group]
+
+            # Closed questions: did every person of the group give a valid answer?
+            complete = None
+            if not multiple:
+                complete = np.bincount(groups, minlength=len(self.groups)) == self.group_rows
+
+            counts = _count_slices(groups, answers, self.answer_values[self.letters[col]], complete)
+            for g in range(len(self.groups)):
+                result[g][col] = counts.get(g, _empty_counts())
+        return result
+
+    # This function lists the counted questions that were asked for
+    def _wanted(self, only) -> list:
+        columns = self.counted_columns()
+        return columns if only is None else [col for col in columns if col in only]
+
+    # This function gives back the answer codes and group codes of one question
+    def _column(self, col):
+        start, end = self._slices[self.letters[col]]
+        answers = self.table["answer"].to_numpy()[start:end]
+        groups = self.table["group"].cat.codes.to_numpy()[start:end].astype(np.int64)
+        return answers, groups
+
+# This function builds the long table from the answer sheet.
+# group_col_name is the column used to split the results (or None).
+def build_answer_facts(df: pd.DataFrame, control_map: dict, group_col_name=None) -> AnswerFacts:
+    columns = list(df.columns)
+    n_rows = len(df)
+
+    # Find the group of each person, cleaned the same way as always (spaces removed, no empty ones)
+    group_codes = np.full(n_rows, -1, dtype=np.int64)
+    groups = []
+    group_is_text = False
+    if group_col_name is not None:
+        keys = df[group_col_name]
+        group_is_text = keys.dtype == object or is_text_dtype(keys.dtype)
+        if group_is_text:
+            # Empty cells become the text "nan", like they always did
+            keys = keys.astype(object)
+            keys = keys.where(keys.notna(), np.nan).astype(str).str.strip()
+        keys = keys.where(keys.notna() & (keys != ""))
+        group_codes, uniques = pd.factorize(keys)
+        groups = list(uniques)
+    group_rows = np.bincount(group_codes[group_codes >= 0], minlength=len(groups))
+
+    respondents, letter_codes, qtype_codes, answer_codes = [], [], [], []
+    letters, qtypes, answer_values = [], [], {}
+    for i, col in enumerate(columns):
+        ctrl_kw = control_map.get(col, QTYPE_CLOSED)
+
+        # Skip if the question is open or marked to ignore
+        if ctrl_kw in (QTYPE_IGNORE, QTYPE_OPEN):
+            continue
+
+        if ctrl_kw == QTYPE_MULTIPLE:
+            # Break multiple answers into pieces, and find the row each piece came from
+            expanded = expand_multiple(df[col], sep=MULTIPLE_SEPARATOR)
+            rows = df.index.get_indexer(expanded.index)
+            answers = expanded.to_numpy()
+        else:
+            # Clean every answer once
+            cleaned, keep = clean_single_values(df[col])
+            rows = np.flatnonzero(keep)
+            answers = cleaned.to_numpy()
+
+        # Number the different answers in the order they first show up
+        codes, uniques = pd.factorize(answers)
+
+        letter = colnum_to_excel(i)
+        if ctrl_kw not in qtypes:
+            qtypes.append(ctrl_kw)
+        letters.append(letter)
+        answer_values[letter] = uniques
+
+        respondents.append(rows.astype(np.int32))
+        letter_codes.append(np.full(len(rows), len(letters) - 1, dtype=np.int32))
+        qtype_codes.append(np.full(len(rows), qtypes.index(ctrl_kw), dtype=np.int32))
+        answer_codes.append(codes.astype(np.int32))
+
+    def joined(parts):
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+
+    respondent = joined(respondents)
+    table = pd.DataFrame({
+        "respondent": respondent,
+        "column": pd.Categorical.from_codes(joined(letter_codes), categories=letters),
+        "qtype": pd.Categorical.from_codes(joined(qtype_codes), categories=qtypes),
+        "group": pd.Categorical.from_codes(group_codes[respondent], categories=[str(g) for g in groups]) if groups else pd.Categorical([np.nan] * len(respondent)),
+        "answer": joined(answer_codes),
+    })
+
+    return AnswerFacts(table, answer_values, columns, control_map, n_rows, groups, group_rows, group_col_name, group_is_text, group_codes)
+
+# This function counts the answers of one question for several slices (everyone, or each group) at once.
+# slices says which slice (0, 1, 2...) each answer belongs to; answers are codes into values.
+# complete says, for closed questions, if every person of the slice answered.
+# It gives back {slice: counts}, each counts sorted like value_counts() does.
+def _count_slices(slices: np.ndarray, answers: np.ndarray, values: np.ndarray, complete) -> dict:
+    n_answers = max(len(values), 1)
+
+    # Number every (slice, answer) pair, in order of appearance, and count them in a single pass
+    pair_codes, pairs = pd.factorize(slices.astype(np.int64) * n_answers + answers)
+    sizes = np.bincount(pair_codes, minlength=len(pairs))
+    pair_slices = pairs // n_answers
+    pair_answers = pairs % n_answers
+
+    # Only columns mixing text with numbers need their answer types fixed slice by slice
+    fix_types = complete is not None and infer_dtype(values, skipna=False) not in ("string", "empty")
+
+    # Put the pairs of each slice together, keeping their order of appearance
+    order = np.argsort(pair_slices, kind="stable")
+    bounds = np.flatnonzero(np.diff(pair_slices[order])) + 1
+
+    counts_by_slice = {}
+    for chunk in np.split(order, bounds) if len(order) else []:
+        g = int(pair_slices[chunk[0]])
+        keys = values[pair_answers[chunk]]
+
+        # Give the answers the same type cleaning this slice alone would give them
+        if fix_types:
+            keys = match_apply_dtype(pd.Series(keys, dtype=object), bool(complete[g]))
+
+        # Biggest first, breaking ties exactly like value_counts() (Series.sort_values) does
+        n = sizes[chunk]
+        desc = np.arange(len(n))[::-1][n[::-1].argsort(kind="quicksort")][::-1]
+        counts_by_slice[g] = pd.Series(n[desc], index=pd.Index(keys)[desc])
+
+    return counts_by_slice
+
+# This function returns counts for a question nobody answered
+def _empty_counts() -> pd.Series:
+    return pd.Series(dtype="int64")
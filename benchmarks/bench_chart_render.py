@@ -0,0 +1,103 @@
+# This benchmark compares the old pyplot chart functions (a new figure for every chart)
+# with the renderer in chart_renderer.py (figures made once and reused), in charts per second.
+# Run it from the project root: python benchmarks/bench_chart_render.py
+
+import os
+import sys
+import time
+import hashlib
+import tempfile
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chart_utils import PIE_PARAMS, BAR_PARAMS
+from chart_renderer import ChartRenderer
+from config import OTHERS_LABEL
+from helpers import wrap_labels
+
+CHARTS = 40
+
+# The old pie chart, kept here only to compare against
+def save_pie_jpg_legacy(values_pct: pd.Series, outfile: str):
+    raw_labels = [f"{idx} ({val:.1f}%)" for idx, val in values_pct.items()]
+    labels = wrap_labels(raw_labels, wrap_width=30, max_chars=60)
+    fig, ax = plt.subplots(figsize=(9, 9))
+    ax.pie((values_pct / 100.0).values, labels=labels, startangle=90, colors=PIE_PARAMS["colors"][:len(values_pct)],
+           textprops={'fontsize': 10}, wedgeprops={'linewidth': 1, 'edgecolor': 'white'})
+    ax.axis('equal')
+    plt.subplots_adjust(left=0.20, right=0.80, top=0.80, bottom=0.20)
+    plt.savefig(outfile, format="jpg", dpi=200)
+    plt.close()
+
+# The old bar chart, kept here only to compare against
+def save_bar_jpg_legacy(values_pct: pd.Series, outfile: str):
+    if OTHERS_LABEL in values_pct.index:
+        outros_val = values_pct[OTHERS_LABEL]
+        values_pct = pd.concat([values_pct.drop(OTHERS_LABEL), pd.Series({OTHERS_LABEL: outros_val})])
+    values_pct = values_pct[::-1]
+    labels = list(values_pct.index)
+    vals = list(values_pct.values)
+    plt.figure(figsize=(12, 8))
+    ax = plt.gca()
+    bars = ax.barh(range(len(vals)), vals, color=BAR_PARAMS["color"])
+    ax.set_yticks(range(len(vals)))
+    ax.set_yticklabels(wrap_labels(labels), fontsize=10)
+    ax.set_xlabel("Porcentagem (%)")
+    for spine in ["top", "right", "left"]:
+        ax.spines[spine].set_visible(False)
+    for rect, v in zip(bars, vals):
+        ax.text(rect.get_width() + 0.5, rect.get_y() + rect.get_height()/2, f"{v:.1f}%", va="center", fontsize=9)
+    plt.subplots_adjust(left=0.35, right=0.95, top=0.95, bottom=0.1)
+    plt.savefig(outfile, format="jpg", dpi=200)
+    plt.close()
+
+# This function builds the percentages of the test charts: pies with 2-4 answers, bars with 5-11
+def make_charts(count: int) -> list:
+    rng = np.random.default_rng(42)
+    charts = []
+    for i in range(count):
+        kind = "pie" if i % 2 == 0 else "bar"
+        n = rng.integers(2, 5) if kind == "pie" else rng.integers(5, 12)
+        vals = rng.random(n)
+        labels = [f"Resposta {j} de um questionário bem comprido" for j in range(n)]
+        charts.append((kind, pd.Series(vals / vals.sum() * 100, index=labels).sort_values(ascending=False)))
+    return charts
+
+def md5(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def main():
+    charts = make_charts(CHARTS)
+    renderer = ChartRenderer(PIE_PARAMS, BAR_PARAMS)
+    legacy_draw = {"pie": save_pie_jpg_legacy, "bar": save_bar_jpg_legacy}
+    new_draw = {"pie": renderer.render_pie, "bar": renderer.render_bar}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.jpg")
+        new_path = os.path.join(tmp, "new.jpg")
+
+        # Both must give the very same pixels
+        for kind, pct in charts[:4]:
+            legacy_draw[kind](pct, legacy_path)
+            new_draw[kind](pct, new_path)
+            assert md5(legacy_path) == md5(new_path), f"{kind} chart differs"
+
+        results = {}
+        for name, draw, path in (("pyplot (legacy)", legacy_draw, legacy_path), ("Figure + Agg", new_draw, new_path)):
+            start = time.perf_counter()
+            for kind, pct in charts:
+                draw[kind](pct, path)
+            results[name] = CHARTS / (time.perf_counter() - start)
+
+    print(f"Rendering {CHARTS} charts (half pie, half bar)")
+    for name, rate in results.items():
+        print(f"{name:<18}{rate:>8.1f} charts/sec")
+    print(f"{'speedup':<18}{results['Figure + Agg'] / results['pyplot (legacy)']:>8.2f}x")
+
+if __name__ == "__main__":
+    main()
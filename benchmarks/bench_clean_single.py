@@ -0,0 +1,51 @@
+# This benchmark compares the old clean_single (one Python lambda per cell)
+# with the vectorized one in data_cleaning.py, on 100k-row columns.
+# Run it from the project root: python benchmarks/bench_clean_single.py
+
+import os
+import sys
+import timeit
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning import clean_single
+
+ROWS = 100_000
+REPEAT = 5
+
+# The old implementation, kept here only to compare against
+def clean_single_legacy(series: pd.Series) -> pd.Series:
+    s = series.apply(
+        lambda x: None if (pd.isna(x) or (isinstance(x, str) and x.strip() == "")) else (x.strip() if isinstance(x, str) else x)
+    )
+    return s.dropna()
+
+# This function builds the test columns: only text, text mixed with numbers, and only numbers
+def make_columns(rows: int) -> dict:
+    rng = np.random.default_rng(42)
+    answers = np.array(["Sim", " Não ", "Talvez", "  ", "Não sei ", None], dtype=object)
+    mixed = np.array(["Sim", " 3 ", 4, 5.5, "", None], dtype=object)
+    numbers = np.array([1, 2, 3, 4, 5, None], dtype=object)
+
+    return {
+        "text": pd.Series(answers[rng.integers(0, len(answers), rows)]),
+        "mixed": pd.Series(mixed[rng.integers(0, len(mixed), rows)]),
+        "numbers (object)": pd.Series(numbers[rng.integers(0, len(numbers), rows)]),
+        "numbers (float64)": pd.Series(rng.integers(1, 6, rows)).where(rng.random(rows) > 0.1),
+    }
+
+def main():
+    print(f"clean_single on {ROWS:,} rows (best of {REPEAT})")
+    print(f"{'column':<20}{'legacy (ms)':>14}{'vectorized (ms)':>18}{'speedup':>10}")
+
+    for name, series in make_columns(ROWS).items():
+        # Both versions must give the very same answers
+        pd.testing.assert_series_equal(clean_single_legacy(series), clean_single(series))
+
+        legacy = min(timeit.repeat(lambda: clean_single_legacy(series), number=1, repeat=REPEAT))
+        vectorized = min(timeit.repeat(lambda: clean_single(series), number=1, repeat=REPEAT))
+        print(f"{name:<20}{legacy * 1000:>14.1f}{vectorized * 1000:>18.1f}{legacy / vectorized:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
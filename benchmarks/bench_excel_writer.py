@@ -0,0 +1,116 @@
+# This benchmark writes a workbook with more than a thousand group sheets, comparing the old way
+# (4 new formats per sheet, 2 calls per answer, everything kept in memory until the end) with the
+# summarizer now (shared formats, 1 call per answer), with and without xlsxwriter's constant_memory mode.
+# Every way runs in its own process, so the peak memory of one doesn't hide the others.
+# Run it from the project root: python benchmarks/bench_excel_writer.py
+
+import os
+import sys
+import time
+import resource
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers import sanitize_sheet_name, colnum_to_excel
+from summarizer import _sheet_formats, write_answer_rows
+
+GROUPS = 1200
+QUESTIONS = 20
+
+# The old way of writing one sheet, kept here only to compare against
+def write_sheet_legacy(pct_by_col: dict, writer, workbook, sheet_label: str):
+    title_fmt   = workbook.add_format({"bold": True})
+    percent_fmt = workbook.add_format({"num_format": "0.00%"})
+    header_fmt  = workbook.add_format({"bold": True})
+    note_fmt    = workbook.add_format({"italic": True, "font_color": "#666666"})
+
+    ws_name = sanitize_sheet_name(sheet_label, set(writer.sheets.keys()))
+    ws = workbook.add_worksheet(ws_name)
+
+    row = 0
+    ws.write(row, 0, "Question / Answer", header_fmt)
+    ws.write(row, 1, "Percentage", header_fmt)
+    row += 1
+
+    for col_idx, (col, pct_excel) in enumerate(pct_by_col.items()):
+        ws.write(row, 0, f"[{colnum_to_excel(col_idx)}] {col}", title_fmt)
+        row += 1
+        for answer, p in pct_excel.items():
+            ws.write(row, 0, str(answer))
+            ws.write_number(row, 1, float(p) / 100.0, percent_fmt)
+            row += 1
+        row += 1
+
+    ws.set_column(0, 0, 50)
+    ws.set_column(1, 1, 12)
+
+# The same sheet, written the way summarize_counts_to_excel_and_charts does it now
+def write_sheet_now(pct_by_col: dict, writer, workbook, sheet_label: str):
+    title_fmt, percent_fmt, header_fmt, note_fmt = _sheet_formats(workbook)
+
+    ws_name = sanitize_sheet_name(sheet_label, writer.sheets)
+    ws = workbook.add_worksheet(ws_name)
+    ws.set_column(0, 0, 50)
+    ws.set_column(1, 1, 12, percent_fmt)
+
+    row = 0
+    ws.write(row, 0, "Question / Answer", header_fmt)
+    ws.write(row, 1, "Percentage", header_fmt)
+    row += 1
+
+    for col_idx, (col, pct_excel) in enumerate(pct_by_col.items()):
+        ws.write(row, 0, f"[{colnum_to_excel(col_idx)}] {col}", title_fmt)
+        row = write_answer_rows(ws, row + 1, pct_excel) + 1
+
+WAYS = {
+    "legacy": (write_sheet_legacy, False),
+    "shared formats + write_row": (write_sheet_now, False),
+    "... + constant_memory": (write_sheet_now, True),
+}
+
+# This function builds the percentages of every question of every group
+def make_percentages() -> list:
+    rng = np.random.default_rng(42)
+    groups = []
+    for _ in range(GROUPS):
+        pct_by_col = {}
+        for q in range(QUESTIONS):
+            n = int(rng.integers(2, 12))
+            counts = rng.integers(1, 200, n)
+            pct_by_col[f"Pergunta {q}"] = pd.Series(counts / counts.sum() * 100, index=[f"Resposta {j}" for j in range(n)])
+        groups.append(pct_by_col)
+    return groups
+
+# This function writes the whole workbook one way and prints the seconds, the extra memory it needed and the file size
+def run_one(way: str):
+    write_sheet, constant_memory = WAYS[way]
+    groups = make_percentages()
+    before_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.xlsx")
+        start = time.perf_counter()
+        with pd.ExcelWriter(path, engine="xlsxwriter", engine_kwargs={"options": {"constant_memory": constant_memory}}) as writer:
+            for g, pct_by_col in enumerate(groups):
+                write_sheet(pct_by_col, writer, writer.book, f"Grupo {g}")
+        seconds = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+    extra_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - before_mb
+    print(f"{way:<32}{seconds:>10.1f}{extra_mb:>14.0f}{size / 1024 / 1024:>10.1f}")
+
+def main():
+    print(f"Writing {GROUPS:,} group sheets with {QUESTIONS} questions each")
+    print(f"{'writer':<32}{'seconds':>10}{'extra RSS MB':>14}{'file MB':>10}")
+    sys.stdout.flush()
+    for way in WAYS:
+        subprocess.run([sys.executable, os.path.abspath(__file__), way], check=True)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run_one(sys.argv[1])
+    else:
+        main()
@@ -0,0 +1,58 @@
+# This benchmark compares the old expand_multiple (split every cell through .apply,
+# then explode) with the vectorized one in data_cleaning.py, on 100k-row columns.
+# Run it from the project root: python benchmarks/bench_expand_multiple.py
+
+import os
+import sys
+import timeit
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning import expand_multiple
+
+ROWS = 100_000
+REPEAT = 5
+
+# The old implementation, kept here only to compare against
+def expand_multiple_legacy(series: pd.Series, sep=";") -> pd.Series:
+    def split_cell(x):
+        if pd.isna(x):
+            return []
+        if isinstance(x, str):
+            parts = [p.strip() for p in x.split(sep)]
+            return [p for p in parts if p != ""]
+        return [x]
+
+    exploded = series.apply(split_cell).explode()
+    return exploded[exploded.notna()]
+
+# This function builds a multiple choice column like Forms exports them:
+# up to 4 of 8 options per person, in the order of the form, ending with ";"
+def make_column(rows: int) -> pd.Series:
+    rng = np.random.default_rng(42)
+    options = [f"Opção {i}" for i in range(8)]
+    cells = []
+    for _ in range(rows):
+        k = rng.integers(0, 5)
+        picked = sorted(rng.choice(len(options), size=k, replace=False))
+        cells.append("".join(f"{options[i]};" for i in picked) if k else None)
+    return pd.Series(cells, dtype=object)
+
+def main():
+    series = make_column(ROWS)
+
+    # Both versions must give the very same answers
+    pd.testing.assert_series_equal(expand_multiple_legacy(series), expand_multiple(series))
+
+    legacy = min(timeit.repeat(lambda: expand_multiple_legacy(series), number=1, repeat=REPEAT))
+    vectorized = min(timeit.repeat(lambda: expand_multiple(series), number=1, repeat=REPEAT))
+    with_matrix = min(timeit.repeat(lambda: expand_multiple(series, return_matrix=True), number=1, repeat=REPEAT))
+
+    print(f"expand_multiple on {ROWS:,} rows (best of {REPEAT})")
+    print(f"legacy:              {legacy * 1000:8.1f} ms")
+    print(f"vectorized:          {vectorized * 1000:8.1f} ms ({legacy / vectorized:.1f}x)")
+    print(f"vectorized + matrix: {with_matrix * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# This benchmark measures how long importing our modules takes in a fresh Python (python -X importtime),
+# and which heavy libraries each import pulls in. Every module is imported REPEATS times, each in a new process,
+# and the median is shown. With --baseline, the same is measured for an older commit (e.g. --baseline HEAD~1),
+# checked out in a temporary folder, to compare the cold start before and after.
+# Run it from the project root: python benchmarks/bench_import_time.py [--baseline REV]
+
+import os
+import re
+import sys
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["main", "summarizer", "generate_report", "ai_integration"]
+HEAVY = ["matplotlib", "openpyxl", "docx", "openai", "httpx", "tiktoken"]
+REPEATS = 5
+
+# One line of -X importtime: "import time: self [us] | cumulative | imported package"
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+# This function imports "module" in a new Python started in "folder", giving back
+# the milliseconds the import took and the heavy libraries it loaded
+def import_time(folder: str, module: str):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=folder, capture_output=True, text=True, env=dict(os.environ, MPLBACKEND="Agg"))
+    if result.returncode != 0:
+        return None, []
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+    return cumulative.get(module, 0) / 1000, [name for name in HEAVY if name in cumulative]
+
+# This function gives back {module: (median milliseconds, heavy libraries)} for the modules of "folder"
+def measure(folder: str) -> dict:
+    results = {}
+    for module in MODULES:
+        runs = [import_time(folder, module) for _ in range(REPEATS)]
+        if runs[0][0] is None:
+            results[module] = (None, [])
+        else:
+            results[module] = (statistics.median(ms for ms, _ in runs), runs[0][1])
+    return results
+
+# This function copies commit "rev" into a temporary folder (with our config_api.py, if there is one)
+def checkout(rev: str) -> str:
+    folder = tempfile.mkdtemp()
+    archive = subprocess.run(["git", "archive", rev], cwd=ROOT, capture_output=True, check=True).stdout
+    subprocess.run(["tar", "-x", "-C", folder], input=archive, check=True)
+    if os.path.exists(os.path.join(ROOT, "config_api.py")):
+        shutil.copy(os.path.join(ROOT, "config_api.py"), folder)
+    return folder
+
+def print_results(title: str, results: dict, baseline: dict = None):
+    print(title)
+    print(f"  {'import':<18}{'ms':>10}{'before':>10}  heavy libraries loaded")
+    for module, (ms, heavy) in results.items():
+        before = baseline[module][0] if baseline else None
+        ms_text = f"{ms:.0f}" if ms is not None else "failed"
+        before_text = f"{before:.0f}" if before is not None else "-"
+        print(f"  {module:<18}{ms_text:>10}{before_text:>10}  {', '.join(heavy) or '-'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of our modules.")
+    parser.add_argument("--baseline", help="a commit to compare with (e.g. HEAD~1)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        folder = checkout(args.baseline)
+        try:
+            baseline = measure(folder)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        print_results(f"Baseline ({args.baseline}), median of {REPEATS} fresh processes", baseline)
+
+    print_results(f"Working tree, median of {REPEATS} fresh processes", measure(ROOT), baseline)
+
+if __name__ == "__main__":
+    main()
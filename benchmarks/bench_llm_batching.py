@@ -0,0 +1,72 @@
+# This benchmark analyzes the sections of many group reports against a local stub of the chat-completions endpoint
+# (see stub_chat_server.py), one section per request and several sections per request (ask_ai_sections),
+# counting the round trips. The stub answers batches with a JSON object, but leaves one section out of every
+# batch, so the sections asked again one by one are counted too.
+# It needs config_api.py like the rest of the LLM features (any key works against the stub).
+# Run it from the project root: python benchmarks/bench_llm_batching.py
+
+import os
+import re
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stub_chat_server import StubChatServer, stub_answer
+
+GROUPS = 20
+SECTIONS = 7
+LATENCY = 0.3
+SECONDS_PER_ANALYSIS = 0.02
+
+_ITEM = re.compile(r'### Item "(\d+)": seção "([^"]*)" do relatório de "([^"]*)"')
+
+# This function answers like the LLM would: a JSON object for batches (missing the last item), text otherwise
+def respond(prompt: str) -> str:
+    items = _ITEM.findall(prompt)
+    if not items:
+        time.sleep(SECONDS_PER_ANALYSIS)
+        return stub_answer(prompt)
+
+    time.sleep(SECONDS_PER_ANALYSIS * len(items))
+    return json.dumps({item_id: f"Análise {section} ({group})" for item_id, section, group in items[:-1]}, ensure_ascii=False)
+
+def main():
+    with StubChatServer(latency=LATENCY, respond=respond) as server:
+        # The OpenAI clients read it when they are made (OPENAI_BASE_URL in config.py is None)
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        import llm_client
+        from llm_client import RateLimiter
+        from ai_integration import ask_ai_sections, get_section_analyzer_prompt
+
+        # The stub has no limits
+        llm_client._rate_limiter = RateLimiter(rpm=None, tpm=None)
+
+        sections = [
+            (f"Grupo {g}", f"Seção {s}", {"C": {f"Resposta {j}": 100 / 4 for j in range(4)}, "D": {"Sim": 60.0, "Não": 40.0}})
+            for g in range(GROUPS) for s in range(SECTIONS)
+        ]
+
+        # Keep the console for the results
+        sys.stdout = open(os.devnull, "w")
+        singles = [stub_answer(get_section_analyzer_prompt(section, data)) for _, section, data in sections]
+        results = []
+        for batch_size in (1, 10):
+            server.requests = 0
+            start = time.perf_counter()
+            analyses = ask_ai_sections(sections, batch_size=batch_size, use_cache=False)
+            seconds = time.perf_counter() - start
+
+            for (group, section, _), single, analysis in zip(sections, singles, analyses):
+                assert analysis in (single, f"Análise {section} ({group})"), f"wrong analysis for {section} of {group}"
+            results.append((batch_size, seconds, server.requests))
+        sys.stdout = sys.__stdout__
+
+    print(f"{len(sections)} sections ({GROUPS} groups x {SECTIONS} sections), {LATENCY * 1000:.0f} ms per request "
+          f"+ {SECONDS_PER_ANALYSIS * 1000:.0f} ms per analysis")
+    print(f"{'sections per request':<24}{'seconds':>10}{'requests':>10}")
+    for batch_size, seconds, requests in results:
+        print(f"{batch_size:<24}{seconds:>10.2f}{requests:>10}")
+
+if __name__ == "__main__":
+    main()
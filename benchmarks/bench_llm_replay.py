@@ -0,0 +1,131 @@
+# This benchmark times the whole LLM report (outline, section analyses of every group, DOCX files) without any network.
+# First it summarizes the survey in this process (like main.py --chart-output excel, so the reports have no chart
+# pictures), then it records every prompt and answer of a run against a local stub of the chat-completions endpoint
+# (see stub_chat_server.py), then it replays that recording (see llm_providers.py) with a few simulated latencies,
+# and checks every replayed run writes exactly the same reports as the recorded one.
+# The recording needs config_api.py like the rest of the LLM features (any key works against the stub); the replays don't.
+# It writes the reports to OUTPUT_DIR like main.py does.
+# Run it from the project root: python benchmarks/bench_llm_replay.py
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stub_chat_server import StubChatServer, stub_answer
+
+LATENCY = 0.3
+REPLAY_LATENCIES = (0.0, 0.3, 1.0)
+
+_ITEM = re.compile(r'### Item "(\d+)": seção "([^"]*)" do relatório de "([^"]*)"')
+
+# This function answers like the LLM would: the report outline, a JSON object for batches of sections, text otherwise
+def respond(prompt: str) -> str:
+    from llm_prompts import LLM_OUTPUT_BY_GROUPS
+    if "roteiro" in prompt:
+        return LLM_OUTPUT_BY_GROUPS
+
+    items = _ITEM.findall(prompt)
+    if items:
+        return json.dumps({item_id: f"{stub_answer(section)} ({group})" for item_id, section, group in items}, ensure_ascii=False)
+    return stub_answer(prompt)
+
+# This function summarizes every sheet (everyone, then each group) into the results registry, like main.py does,
+# writing the summaries to a throwaway Excel file in "folder"
+def summarize_survey(folder: str):
+    import pandas as pd
+    from config import GENERAL_LABEL, GROUP_BY_COL_INDEX
+    from survey_loader import get_survey_workbook
+    from summarizer import summarize_counts, write_summary_sheet
+
+    survey = get_survey_workbook()
+    group_col_name = survey.df.columns[GROUP_BY_COL_INDEX] if GROUP_BY_COL_INDEX is not None else None
+    facts = survey.answer_facts(group_col_name)
+
+    sheets = [(GENERAL_LABEL, facts.general_counts())]
+    if group_col_name is not None:
+        sheets += [(str(g).strip() or "Unknown", counts) for g, counts in zip(facts.groups, facts.group_counts())]
+
+    with pd.ExcelWriter(os.path.join(folder, "analysis.xlsx"), engine="xlsxwriter") as writer:
+        for label, counts in sheets:
+            questions = summarize_counts(counts, facts.columns, survey.control_map)
+            write_summary_sheet(questions, writer, writer.book, label, [], "excel")
+
+# This function counts the report sections analyzed in the recorded prompts (in batches or one by one)
+def count_sections(recordings_path: str) -> int:
+    sections = 0
+    with open(recordings_path, encoding="utf-8") as f:
+        for line in f:
+            prompt = json.loads(line)["prompt"]
+            items = _ITEM.findall(prompt)
+            if items:
+                sections += len(items)
+            elif "análise textual e interpretativa da seção" in prompt:
+                sections += 1
+    return sections
+
+# This function writes the reports with "provider" and gives back how long it took and the text of every report
+def build_all_reports(provider):
+    import generate_report
+    from config import OUTPUT_DIR
+    from llm_providers import set_llm_provider
+
+    # The reports are only built with the LLM when it's on
+    generate_report.LLM_FEATURES_ON = True
+    set_llm_provider(provider)
+
+    start = time.perf_counter()
+    generate_report.generate_diagnosis_report(use_cache=False)
+    seconds = time.perf_counter() - start
+
+    import docx
+    texts = {}
+    for path in sorted(glob.glob(os.path.join(OUTPUT_DIR, "*_report.docx"))):
+        texts[os.path.basename(path)] = [paragraph.text for paragraph in docx.Document(path).paragraphs]
+    return seconds, texts
+
+def main():
+    import llm_client
+    from llm_client import RateLimiter
+    from llm_providers import RecordingProvider, ReplayProvider, make_llm_provider
+
+    # Neither the stub nor the recordings have limits
+    llm_client._rate_limiter = RateLimiter(rpm=None, tpm=None)
+    folder = tempfile.mkdtemp()
+    recordings_path = os.path.join(folder, "llm_recordings.jsonl")
+
+    # Keep the console for the results
+    sys.stdout = open(os.devnull, "w")
+    summarize_survey(folder)
+    with StubChatServer(latency=LATENCY, respond=respond) as server:
+        # The OpenAI clients read it when they are made (OPENAI_BASE_URL in config.py is None)
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        recorder = RecordingProvider(make_llm_provider("openai"), recordings_path)
+        seconds, recorded = build_all_reports(recorder)
+        results = [(f"record (stub, {LATENCY * 1000:.0f} ms)", seconds, server.requests)]
+
+    # The reports must have asked for more than their outline
+    sections = count_sections(recordings_path)
+    assert recorder.recorded > 1 and sections > 0, "no report section was analyzed"
+
+    # From here on, nothing can reach the stub
+    os.environ["OPENAI_BASE_URL"] = "http://127.0.0.1:9/v1"
+    for latency in REPLAY_LATENCIES:
+        replayer = ReplayProvider(recordings_path, latency)
+        seconds, replayed = build_all_reports(replayer)
+        assert replayer.not_recorded == 0, "some prompts were not recorded"
+        assert replayed == recorded, "the replayed reports differ from the recorded ones"
+        results.append((f"replay ({latency * 1000:.0f} ms)", seconds, replayer.replayed))
+    sys.stdout = sys.__stdout__
+
+    print(f"{len(recorded)} reports, {sections} sections, {recorder.recorded} LLM answers recorded in {recordings_path}")
+    print(f"{'way':<24}{'seconds':>10}{'answers':>10}")
+    for way, seconds, answers in results:
+        print(f"{way:<24}{seconds:>10.2f}{answers:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# This benchmark sends the section prompts of many group reports to a local stub of the chat-completions
+# endpoint (see stub_chat_server.py), one by one like before (ask_ai in a loop) and all at the same time
+# (ask_ai_many), and checks every answer comes back for the right prompt, in order.
+# It needs config_api.py like the rest of the LLM features (any key works against the stub).
+# Run it from the project root: python benchmarks/bench_llm_sections.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stub_chat_server import StubChatServer, stub_answer
+
+GROUPS = 20
+SECTIONS = 7
+LATENCY = 0.1
+
+def main():
+    with StubChatServer(latency=LATENCY) as server:
+        # The OpenAI clients read it when they are made (OPENAI_BASE_URL in config.py is None)
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        import llm_client
+        from llm_client import RateLimiter
+        from ai_integration import ask_ai, ask_ai_many, get_section_analyzer_prompt
+
+        # The stub has no limits, and every way must really ask (not reuse the answers of the first one)
+        llm_client._rate_limiter = RateLimiter(rpm=None, tpm=None)
+
+        prompts = [
+            get_section_analyzer_prompt(f"Seção {s}", {"C": {f"Resposta {j} do grupo {g}": 100 / 4 for j in range(4)}})
+            for g in range(GROUPS) for s in range(SECTIONS)
+        ]
+        expected = [stub_answer(prompt) for prompt in prompts]
+
+        print(f"{len(prompts)} section prompts ({GROUPS} groups x {SECTIONS} sections), {LATENCY * 1000:.0f} ms per answer")
+        print(f"{'way':<28}{'seconds':>10}{'peak in flight':>16}")
+
+        start = time.perf_counter()
+        answers = [ask_ai(prompt, use_cache=False) for prompt in prompts]
+        seconds = time.perf_counter() - start
+        assert answers == expected, "sequential answers don't match their prompts"
+        print(f"{'one by one (ask_ai)':<28}{seconds:>10.2f}{server.peak_in_flight:>16}")
+
+        for concurrency in (8, 32):
+            server.peak_in_flight = 0
+            start = time.perf_counter()
+            answers = ask_ai_many(prompts, concurrency=concurrency, use_cache=False)
+            seconds = time.perf_counter() - start
+            assert answers == expected, "concurrent answers don't match their prompts"
+            assert server.peak_in_flight <= concurrency, "more requests at once than allowed"
+            print(f"{f'ask_ai_many, {concurrency} at once':<28}{seconds:>10.2f}{server.peak_in_flight:>16}")
+
+if __name__ == "__main__":
+    main()
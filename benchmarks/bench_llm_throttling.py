@@ -0,0 +1,54 @@
+# This benchmark sends section prompts to a local stub of the chat-completions endpoint that acts like a busy
+# provider (see stub_chat_server.py): it refuses requests over its per-minute limit with 429 and fails some with 503.
+# It compares only trying again after being refused (no buckets) with waiting our turn in the client's
+# requests-per-minute bucket first, and checks that every prompt still gets its right answer.
+# It needs config_api.py like the rest of the LLM features (any key works against the stub).
+# Run it from the project root: python benchmarks/bench_llm_throttling.py
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stub_chat_server import StubChatServer, stub_answer
+
+PROMPTS = 60
+CONCURRENCY = 16
+RPM = 240
+BURST = 8
+ERROR_EVERY = 15
+LATENCY = 0.05
+
+def main():
+    import llm_client
+    from llm_client import RateLimiter, TokenBucket
+
+    ways = {
+        "retries only": RateLimiter(rpm=None, tpm=None),
+        "RPM bucket + retries": RateLimiter(rpm=None, tpm=None),
+    }
+    ways["RPM bucket + retries"].requests = TokenBucket(RPM, capacity=BURST)
+
+    print(f"{PROMPTS} prompts, {CONCURRENCY} at once, provider allows {RPM} per minute (bursts of {BURST}) "
+          f"and fails 1 in {ERROR_EVERY}")
+    print(f"{'way':<24}{'seconds':>10}{'requests':>10}{'429s':>8}{'503s':>8}{'failed':>8}")
+
+    for name, limiter in ways.items():
+        with StubChatServer(latency=LATENCY, rpm=RPM, burst=BURST, error_every=ERROR_EVERY) as server:
+            # The OpenAI clients read it when they are made (OPENAI_BASE_URL in config.py is None)
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            from ai_integration import ask_ai_many
+
+            prompts = [f"Seção {i} do relatório" for i in range(PROMPTS)]
+            llm_client._rate_limiter = limiter
+
+            start = time.perf_counter()
+            answers = ask_ai_many(prompts, concurrency=CONCURRENCY, use_cache=False)
+            seconds = time.perf_counter() - start
+
+            failed = sum(answer is None for answer in answers)
+            assert all(answer in (None, stub_answer(prompt)) for prompt, answer in zip(prompts, answers)), "answers don't match their prompts"
+            print(f"{name:<24}{seconds:>10.2f}{server.requests:>10}{server.throttled:>8}{server.errors:>8}{failed:>8}")
+
+if __name__ == "__main__":
+    main()
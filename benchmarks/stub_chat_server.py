@@ -0,0 +1,144 @@
+# This file is a small local HTTP server that answers like the OpenAI chat-completions endpoint,
+# so the LLM code can be tried and timed without the internet and without spending anything.
+# Every answer waits "latency" seconds and is the same for the same prompt
+# (stub_answer, or any other "respond" function given to the server).
+# It can also act like a busy provider: refuse requests over "rpm" per minute with 429 and Retry-After
+# (the limit fills up little by little, starting with "burst" requests), and fail every "error_every"-th request with 503.
+#
+# Use it from another script:
+#     with StubChatServer(latency=0.2) as server:
+#         os.environ["OPENAI_BASE_URL"] = server.base_url
+# or run it on its own (python benchmarks/stub_chat_server.py 8000) and set OPENAI_BASE_URL in config.py.
+
+import sys
+import json
+import time
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# This function gives the answer the stub sends back for a prompt
+def stub_answer(prompt: str) -> str:
+    return f"Análise {hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]}"
+
+class StubChatServer:
+
+    def __init__(self, latency: float = 0.2, port: int = 0, respond=stub_answer, rpm: float = None, burst: float = None,
+                 error_every: int = None):
+        self.latency = latency
+        self.respond = respond
+        self.rpm = rpm
+        self.error_every = error_every
+        self._allowance = burst if burst is not None else (rpm or 0)
+        self._burst = self._allowance
+        self._refilled = time.monotonic()
+
+        # How many requests came in, how many were refused (429) or failed (503),
+        # and the most that were waiting at the same time
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+
+                with server._lock:
+                    server.requests += 1
+                    refusal = server._refusal()
+                if refusal is not None:
+                    self._send(*refusal)
+                    return
+
+                with server._lock:
+                    server.in_flight += 1
+                    server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.latency)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+                prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+                content = server.respond(prompt)
+                self._send(200, {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                              "total_tokens": (len(prompt) + len(content)) // 4},
+                })
+
+            def _send(self, status: int, payload: dict, headers: dict = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            # Keep the console quiet
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    # This function decides if a request is refused, giving back (status, payload, headers), or None.
+    # Called with the lock held.
+    def _refusal(self):
+        if self.error_every and self.requests % self.error_every == 0:
+            self.errors += 1
+            return 503, {"error": {"message": "The server is overloaded", "type": "server_error"}}, {}
+
+        if self.rpm:
+            now = time.monotonic()
+            self._allowance = min(self._burst, self._allowance + (now - self._refilled) * self.rpm / 60)
+            self._refilled = now
+            if self._allowance < 1:
+                self.throttled += 1
+                retry_after = (1 - self._allowance) * 60 / self.rpm
+                return 429, {"error": {"message": "Rate limit reached", "type": "requests"}}, {"Retry-After": f"{retry_after:.3f}"}
+            self._allowance -= 1
+
+        return None
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+if __name__ == "__main__":
+    server = StubChatServer(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8000)
+    print(f"Stub chat-completions server on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,110 @@
+# This file keeps a copy of every chart we drew, named after what's IN the chart
+# (the percentages, the kind of chart, the colors and the sizes).
+# When the same chart is asked for again, even in another run, we reuse the picture instead of drawing it.
+
+import os
+import json
+import shutil
+import hashlib
+from functools import lru_cache
+from importlib.metadata import version
+from config import CACHE_DIR, CHART_CACHE_MAX_MB
+
+# Bump this if the way we draw the charts changes, so old pictures are ignored
+CHART_CACHE_VERSION = 1
+
+# The folder with the cached pictures
+CHART_CACHE_DIR = os.path.join(CACHE_DIR, "charts")
+
+# This function gives back the installed matplotlib version, without importing matplotlib
+# (a run whose charts are all cached never needs it)
+@lru_cache(maxsize=None)
+def _matplotlib_version() -> str:
+    return version("matplotlib")
+
+# This function builds the name of a chart in the cache: a hash of everything that changes its pixels
+def chart_cache_key(kind: str, values_pct, params: dict) -> str:
+    content = {
+        "version": CHART_CACHE_VERSION,
+        "matplotlib": _matplotlib_version(),
+        "kind": kind,
+        "values": [[repr(idx), repr(float(val))] for idx, val in values_pct.items()],
+        "params": params,
+    }
+    text = json.dumps(content, ensure_ascii=False, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# This function returns where a cached chart lives
+def _cached_path(key: str, fmt: str) -> str:
+    return os.path.join(CHART_CACHE_DIR, key[:2], f"{key}.{fmt}")
+
+# This function puts a cached chart at "outfile".
+# It returns False if we never drew this chart before.
+def fetch_cached_chart(key: str, outfile: str, fmt: str) -> bool:
+    cached = _cached_path(key, fmt)
+    if not os.path.exists(cached):
+        return False
+
+    try:
+        if os.path.exists(outfile):
+            os.unlink(outfile)
+
+        # A hard link costs nothing; if the disk doesn't allow it, we copy the picture
+        try:
+            os.link(cached, outfile)
+        except OSError:
+            shutil.copyfile(cached, outfile)
+
+        # Mark it as recently used, so it's the last one to be thrown away
+        os.utime(cached)
+    except OSError as e:
+        print(f"Ignoring cached chart {cached}. Reason: {e}")
+        return False
+
+    return True
+
+# This function saves a chart we just drew into the cache
+def store_cached_chart(key: str, outfile: str, fmt: str):
+    cached = _cached_path(key, fmt)
+    try:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+
+        # Write a temporary copy first, so other processes never see half a picture
+        tmp_path = f"{cached}.{os.getpid()}.tmp"
+        shutil.copyfile(outfile, tmp_path)
+        os.replace(tmp_path, cached)
+    except OSError as e:
+        print(f"Failed to save chart cache. Reason: {e}")
+
+# This function throws away the least recently used charts until the cache fits in max_mb
+def prune_chart_cache(max_mb=CHART_CACHE_MAX_MB):
+    if not os.path.isdir(CHART_CACHE_DIR):
+        return
+
+    entries = []
+    for root, _, files in os.walk(CHART_CACHE_DIR):
+        for filename in files:
+            file_path = os.path.join(root, filename)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_path))
+
+    total = sum(size for _, size, _ in entries)
+    max_bytes = max_mb * 1024 * 1024
+
+    # Oldest first
+    for _, size, file_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(file_path)
+            total -= size
+        except OSError as e:
+            print(f"Failed to delete {file_path}. Reason: {e}")
+
+# This function deletes every cached chart
+def clear_chart_cache():
+    if os.path.isdir(CHART_CACHE_DIR):
+        shutil.rmtree(CHART_CACHE_DIR, ignore_errors=True)
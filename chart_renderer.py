@@ -0,0 +1,114 @@
+# This file draws the charts WITHOUT pyplot. pyplot keeps one global "current figure",
+# which is slow to set up for every chart and breaks when two threads draw at the same time.
+# Here every renderer has its own pie and bar figures, made once and reused for every chart.
+
+import time
+import threading
+import pandas as pd
+from config import OTHERS_LABEL
+from helpers import wrap_labels
+
+# This class keeps one ready-made figure for pie charts and one for bar charts.
+# Only the axes are cleared between charts: the figure, its size, margins and canvas stay.
+class ChartRenderer:
+
+    def __init__(self, pie_params: dict, bar_params: dict):
+        self.pie_params = pie_params
+        self.bar_params = bar_params
+        self._templates = {}
+
+    # This function gives back the (figure, axes) template with the given size and margins,
+    # making it the first time it's needed
+    def _template(self, kind: str, params: dict):
+        if kind not in self._templates:
+            # matplotlib takes a while to import, so only runs that draw charts pay for it
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+            fig = Figure(figsize=params["figsize"])
+            FigureCanvasAgg(fig)
+            ax = fig.add_subplot()
+
+            left, right, top, bottom = params["adjust"]
+            fig.subplots_adjust(left=left, right=right, top=top, bottom=bottom)
+            self._templates[kind] = (fig, ax)
+
+        fig, ax = self._templates[kind]
+        ax.clear()
+        return fig, ax
+
+    # This function saves the figure in the format and DPI of the params,
+    # giving back how many seconds drawing and encoding it took
+    def _save(self, fig, outfile: str, params: dict) -> float:
+        start = time.perf_counter()
+
+        # SVG files get no date inside, so the same chart always gives the same file
+        metadata = {"Date": None} if params["format"] == "svg" else None
+        fig.savefig(outfile, format=params["format"], dpi=params["dpi"], metadata=metadata)
+
+        return time.perf_counter() - start
+
+    # This function draws a pie chart and saves it as a picture, giving back the seconds it took to save
+    def render_pie(self, values_pct: pd.Series, outfile: str):
+        params = self.pie_params
+        fig, ax = self._template("pie", params)
+
+        # Make labels like "Apple (25.0%)", wrapped so they don't overflow
+        raw_labels = [f"{idx} ({val:.1f}%)" for idx, val in values_pct.items()]
+        labels = wrap_labels(raw_labels, wrap_width=params["wrap"][0], max_chars=params["wrap"][1])
+
+        # Draw the pie with labels and colors, starting from the top
+        ax.pie(
+            (values_pct / 100.0).values,
+            labels=labels,
+            startangle=90,
+            colors=params["colors"][:len(values_pct)],
+            textprops={'fontsize': params["fontsize"]},
+            wedgeprops={'linewidth': 1, 'edgecolor': 'white'}
+        )
+
+        # Make sure the pie is round and centered
+        ax.axis('equal')
+
+        return self._save(fig, outfile, params)
+
+    # This function draws a horizontal bar chart and saves it as a picture, giving back the seconds it took to save
+    def render_bar(self, values_pct: pd.Series, outfile: str):
+        params = self.bar_params
+        fig, ax = self._template("bar", params)
+
+        # "Outros" goes to the end, then the order is flipped so the first item is at the top
+        if OTHERS_LABEL in values_pct.index:
+            outros_val = values_pct[OTHERS_LABEL]
+            values_pct = pd.concat([values_pct.drop(OTHERS_LABEL), pd.Series({OTHERS_LABEL: outros_val})])
+        values_pct = values_pct[::-1]
+
+        labels = list(values_pct.index)
+        vals = list(values_pct.values)
+
+        # Draw the bars, with the answers on the side
+        bars = ax.barh(range(len(vals)), vals, color=params["color"])
+        ax.set_yticks(range(len(vals)))
+        ax.set_yticklabels(wrap_labels(labels), fontsize=params["fontsize"])
+        ax.set_xlabel("Porcentagem (%)")
+
+        # Hide the borders we don’t need
+        for spine in ["top", "right", "left"]:
+            ax.spines[spine].set_visible(False)
+
+        # Write the percentage at the end of each bar
+        for rect, v in zip(bars, vals):
+            ax.text(rect.get_width() + 0.5, rect.get_y() + rect.get_height()/2, f"{v:.1f}%", va="center", fontsize=params["value_fontsize"])
+
+        return self._save(fig, outfile, params)
+
+# One renderer per thread, so threads never draw on the same figure
+_local = threading.local()
+
+# This function returns the renderer of the current thread
+def get_chart_renderer(pie_params: dict, bar_params: dict) -> ChartRenderer:
+    renderer = getattr(_local, "renderer", None)
+    if renderer is None or renderer.pie_params is not pie_params or renderer.bar_params is not bar_params:
+        renderer = ChartRenderer(pie_params, bar_params)
+        _local.renderer = renderer
+    return renderer
@@ -1,101 +1,133 @@
-import matplotlib.pyplot as plt 
+import os
 import pandas as pd
-from config import PIE_COLORS, BAR_COLOR, OTHERS_LABEL
-from helpers import wrap_labels
-
-# This function makes a pie chart and saves it as a picture
-def save_pie_jpg(values_pct: pd.Series, outfile: str):
+from concurrent.futures import ProcessPoolExecutor
+from config import PIE_COLORS, BAR_COLOR, CHART_WORKERS, CHART_CACHE_MAX_MB
+from config import CHART_FORMAT, CHART_DPI, CHART_MAX_PIXELS
+from chart_renderer import get_chart_renderer
+from chart_cache import chart_cache_key, fetch_cached_chart, store_cached_chart
+
+# Kinds of chart we know how to draw
+CHART_PIE = "pie"
+CHART_BAR = "bar"
+
+# This class describes one chart to draw later: what kind, the percentages and where to save it.
+# It's small and simple, so it can be sent to another process.
+class ChartJob:
+
+    def __init__(self, kind: str, values_pct: pd.Series, outfile: str):
+        self.kind = kind
+        self.values_pct = values_pct
+        self.outfile = outfile
+
+# Picture formats we know how to save
+CHART_FORMATS = ("png", "jpg", "webp", "svg")
+
+if CHART_FORMAT not in CHART_FORMATS:
+    raise ValueError(f"CHART_FORMAT must be one of {CHART_FORMATS}, not '{CHART_FORMAT}'")
+
+# This function picks the DPI of a chart, lowering CHART_DPI if the picture would be bigger than CHART_MAX_PIXELS
+def chart_dpi(figsize) -> float:
+    if CHART_MAX_PIXELS is None:
+        return CHART_DPI
+    return min(CHART_DPI, CHART_MAX_PIXELS / max(figsize))
+
+# Everything (besides the percentages) that changes how the charts look.
+# They are part of the chart cache key, so changing any of them draws the charts again.
+PIE_PARAMS = {"figsize": (9, 9), "dpi": chart_dpi((9, 9)), "format": CHART_FORMAT, "fontsize": 10, "colors": PIE_COLORS, "adjust": (0.20, 0.80, 0.80, 0.20), "wrap": (30, 60)}
+BAR_PARAMS = {"figsize": (12, 8), "dpi": chart_dpi((12, 8)), "format": CHART_FORMAT, "fontsize": 10, "value_fontsize": 9, "color": BAR_COLOR, "adjust": (0.35, 0.95, 0.95, 0.1)}
+
+# This function makes a pie chart and saves it as a picture (in CHART_FORMAT).
+# It gives back what it wrote (see _chart_stats), or None if there was nothing to draw.
+def save_pie_jpg(values_pct: pd.Series, outfile: str, use_cache: bool = True):
    
     # If there's nothing to draw, we just leave
     if len(values_pct) == 0:
-        return
-
-    # Turn percentages into slices of pie
-    fracs = (values_pct / 100.0).values
-
-    # Wrap labels so they don't overflow
-    #raw_labels = [f"{idx} ({val:.1f}%)"]    
-
-    # Make labels like "Apple (25.0%)"
-    # Using warp_labels to ensure they don't overflow outside the chart area
-    raw_labels = [f"{idx} ({val:.1f}%)" for idx, val in values_pct.items()]
-    labels = wrap_labels(raw_labels, wrap_width=30, max_chars=60)
-    #labels = [f"{idx} ({val:.1f}%)" for idx, val in values_pct.items()]
+        return None
 
-    # Pick colors for each slice
-    colors = PIE_COLORS[:len(values_pct)]
+    # If we already drew this very same chart, we reuse the picture
+    key = chart_cache_key(CHART_PIE, values_pct, PIE_PARAMS) if _chart_cache_on(use_cache) else None
+    if key and fetch_cached_chart(key, outfile, PIE_PARAMS["format"]):
+        return _chart_stats(outfile, PIE_PARAMS, 0.0, cached=True)
 
-    # Make a square canvas to draw on
-    fig, ax = plt.subplots(figsize=(9, 9))
+    # Draw it on the pie figure this thread keeps reusing
+    seconds = get_chart_renderer(PIE_PARAMS, BAR_PARAMS).render_pie(values_pct, outfile)
 
-    # Draw the pie with labels and colors
-    ax.pie(
-        fracs,
-        labels=labels,
-        startangle=90,  # Start from the top
-        colors=colors,
-        textprops={'fontsize': 10},
-        wedgeprops={'linewidth': 1, 'edgecolor': 'white'}  # Make slices look clean
-    )
+    # Keep a copy for the next runs
+    if key:
+        store_cached_chart(key, outfile, PIE_PARAMS["format"])
 
-    # Make sure the pie is round and centered
-    ax.axis('equal')
+    return _chart_stats(outfile, PIE_PARAMS, seconds, cached=False)
 
-    # Adjust the space around the pie so it fits nicely
-    plt.subplots_adjust(left=0.20, right=0.80, top=0.80, bottom=0.20)
-
-    # Save the pie chart as a JPG picture
-    plt.savefig(outfile, format="jpg", dpi=200)
-
-    # Clean up so we’re ready for the next drawing
-    plt.close()
-
-# This function makes a horizontal bar chart and saves it as a picture
-def save_bar_jpg(values_pct: pd.Series, outfile: str):
+# This function makes a horizontal bar chart and saves it as a picture (in CHART_FORMAT).
+# It gives back what it wrote (see _chart_stats), or None if there was nothing to draw.
+def save_bar_jpg(values_pct: pd.Series, outfile: str, use_cache: bool = True):
     
     # If there's nothing to draw, we just leave
     if len(values_pct) == 0:
+        return None
+
+    # If we already drew this very same chart, we reuse the picture
+    key = chart_cache_key(CHART_BAR, values_pct, BAR_PARAMS) if _chart_cache_on(use_cache) else None
+    if key and fetch_cached_chart(key, outfile, BAR_PARAMS["format"]):
+        return _chart_stats(outfile, BAR_PARAMS, 0.0, cached=True)
+
+    # Draw it on the bar figure this thread keeps reusing
+    seconds = get_chart_renderer(PIE_PARAMS, BAR_PARAMS).render_bar(values_pct, outfile)
+
+    # Keep a copy for the next runs
+    if key:
+        store_cached_chart(key, outfile, BAR_PARAMS["format"])
+
+    return _chart_stats(outfile, BAR_PARAMS, seconds, cached=False)
+
+# This function describes one saved chart: its format, how many bytes it has,
+# how long drawing and encoding it took and if it came from the cache
+def _chart_stats(outfile: str, params: dict, seconds: float, cached: bool) -> dict:
+    return {"format": params["format"], "bytes": os.path.getsize(outfile), "seconds": seconds, "cached": cached}
+
+# This function prints how many charts of each format we wrote, their size and the time spent on them
+def print_chart_summary(stats: list):
+    by_format = {}
+    for st in stats:
+        if st is None:
+            continue
+        total = by_format.setdefault(st["format"], {"charts": 0, "cached": 0, "bytes": 0, "seconds": 0.0})
+        total["charts"] += 1
+        total["cached"] += st["cached"]
+        total["bytes"] += st["bytes"]
+        total["seconds"] += st["seconds"]
+
+    for fmt, total in by_format.items():
+        print(f"Charts ({fmt}): {total['charts']} files, {total['bytes'] / 1024 / 1024:.2f} MB written, "
+              f"{total['seconds']:.2f} s drawing and encoding, {total['cached']} from the cache")
+
+# This function tells if the chart cache should be used (CHART_CACHE_MAX_MB = 0 turns it off)
+def _chart_cache_on(use_cache: bool) -> bool:
+    return use_cache and CHART_CACHE_MAX_MB > 0
+
+# This function draws one chart job, giving back what it wrote
+def render_chart_job(job: ChartJob, use_cache: bool = True):
+    if job.kind == CHART_PIE:
+        return save_pie_jpg(job.values_pct, job.outfile, use_cache)
+    return save_bar_jpg(job.values_pct, job.outfile, use_cache)
+
+# This function draws all the chart jobs, using several processes at the same time.
+# workers=1 draws them one by one in this process.
+def render_chart_jobs(jobs: list, workers=CHART_WORKERS, use_cache: bool = True):
+    if not jobs:
         return
 
-    # If there's a slice called "Outros", we move it to the end
-    if OTHERS_LABEL in values_pct.index:
-        outros_val = values_pct[OTHERS_LABEL]
-        values_pct = pd.concat([values_pct.drop(OTHERS_LABEL), pd.Series({OTHERS_LABEL: outros_val})])
-
-    # Flip the order so the first item is at the bottom
-    values_pct = values_pct[::-1]
+    workers = workers or os.cpu_count() or 1
 
-    # Get the names and values to draw
-    labels = list(values_pct.index)
-    vals = list(values_pct.values)
-
-    # Make a wide canvas to draw on
-    plt.figure(figsize=(12, 8))
-    ax = plt.gca()
-
-    # Draw horizontal bars
-    bars = ax.barh(range(len(vals)), vals, color=BAR_COLOR)
-
-    # Put labels on the side
-    ax.set_yticks(range(len(vals)))
-    ax.set_yticklabels(wrap_labels(labels), fontsize=10)
-
-    # Label the x-axis so people know it's percentages
-    ax.set_xlabel("Porcentagem (%)")
-
-    # Hide the borders we don’t need
-    for spine in ["top", "right", "left"]:
-        ax.spines[spine].set_visible(False)
-
-    # Write the percentage at the end of each bar
-    for rect, v in zip(bars, vals):
-        ax.text(rect.get_width() + 0.5, rect.get_y() + rect.get_height()/2, f"{v:.1f}%", va="center", fontsize=9)
-
-    # Adjust the space so labels fit nicely
-    plt.subplots_adjust(left=0.35, right=0.95, top=0.95, bottom=0.1)
+    if workers == 1:
+        print_chart_summary([render_chart_job(job, use_cache) for job in jobs])
+        return
 
-    # Save the bar chart as a JPG picture
-    plt.savefig(outfile, format="jpg", dpi=200)
+    print(f"Drawing {len(jobs)} charts with {workers} processes...")
+    # The charts are drawn on Agg canvases (see chart_renderer.py), so every process gives the same pixels
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Bigger batches mean fewer trips between processes
+        chunksize = max(1, len(jobs) // (workers * 4))
+        stats = list(pool.map(render_chart_job, jobs, [use_cache] * len(jobs), chunksize=chunksize))
 
-    # Clean up so we’re ready for the next drawing
-    plt.close()
\ No newline at end of file
+    print_chart_summary(stats)
\ No newline at end of file
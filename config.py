@@ -10,6 +10,18 @@ OUTPUT_XLSX = "./output/analysis.xlsx"
 # We'll also save the reports and other files we generated throughout the execution.
 OUTPUT_DIR = "output"
 
+# This is the folder where we keep cached copies of the parsed survey between runs.
+# It lives outside OUTPUT_DIR because that folder is wiped at every run.
+CACHE_DIR = ".cache"
+
+# When reading huge sheets with "python main.py --stream", this is how many rows we handle at a time.
+STREAM_CHUNK_ROWS = 5000
+
+# Survey answers repeat the same few texts a lot, so closed and multiple choice columns
+# can be kept in a more compact type after reading the file, to use less memory.
+# None keeps plain Python text, "category" or "string[pyarrow]" use the compact types.
+ANSWER_DTYPE = None
+
 # This is the name of the sheet inside the Excel file that has the answers.
 CONTROL_SHEET_NAME = "respostas_validas"
 
@@ -30,6 +42,36 @@ PIE_COLORS = ["#1E325A", "#710101", "#051C48", "#141E34"]
 # This is the color we use for bar charts.
 BAR_COLOR = "#1E325A"
 
+# Which charts we make: "image" saves chart pictures (and puts them in the Word reports),
+# "excel" puts real Excel charts in the summary sheets (much faster, no pictures at all), "both" does both.
+CHART_OUTPUT = "image"
+
+# How the chart pictures are saved: "png", "jpg", "webp" or "svg".
+# (The Word reports can only hold png and jpg pictures.)
+CHART_FORMAT = "jpg"
+
+# Dots per inch of the chart pictures. Pies are 9x9 inches and bars 12x8, so 200 dpi gives 1800x1800 px pies.
+CHART_DPI = 200
+
+# The biggest width or height (in pixels) of a chart picture. The DPI is lowered to fit; None means no limit.
+CHART_MAX_PIXELS = None
+
+# With True, the Excel file is written row by row straight to disk instead of being kept in memory
+# until the end (xlsxwriter's "constant_memory" mode). Useful with thousands of group sheets.
+EXCEL_CONSTANT_MEMORY = False
+
+# How many processes do the math (top answers, percentages) of the group sheets at the same time.
+# None uses every CPU core, 1 does them one by one. The sheets are always written in the same order.
+SUMMARY_WORKERS = None
+
+# How many processes draw the charts at the same time.
+# None uses every CPU core, 1 draws them one by one.
+CHART_WORKERS = None
+
+# Charts we already drew are kept in CACHE_DIR and reused when the very same chart comes up again.
+# This is the biggest size (in MB) of that cache; the oldest charts are thrown away first. 0 turns it off.
+CHART_CACHE_MAX_MB = 200
+
 # Question type keywords used in the control row
 QTYPE_CLOSED = "FECHADA"    # Closed question
 QTYPE_MULTIPLE = "MÚLTIPLA"  # Multiple choice question
@@ -41,4 +83,55 @@ OTHERS_LABEL = "Outros"
 GENERAL_LABEL = "Geral"
 
 # Flag to activate - or not - the LLM features
-LLM_FEATURES_ON = False
\ No newline at end of file
+LLM_FEATURES_ON = False
+
+# Where the LLM requests go. None uses the real OpenAI API (or the OPENAI_BASE_URL environment variable),
+# e.g. "http://127.0.0.1:8000/v1" sends them to a local server that speaks the same language.
+OPENAI_BASE_URL = None
+
+# Who answers the LLM prompts (see llm_providers.py):
+# "openai" asks OpenAI, "record" asks OpenAI and saves every prompt and answer in LLM_RECORDINGS_PATH,
+# and "replay" answers from LLM_RECORDINGS_PATH without any network, taking LLM_REPLAY_LATENCY_SECONDS per answer
+# (like a real provider would), so the whole report can be timed the same way every run.
+LLM_PROVIDER = "openai"
+LLM_RECORDINGS_PATH = "./files/llm_recordings.jsonl"
+LLM_REPLAY_LATENCY_SECONDS = 0.5
+
+# How many LLM requests can wait for an answer at the same time when analyzing the report sections.
+LLM_CONCURRENCY = 8
+
+# The LLM model and how it answers
+LLM_MODEL = "gpt-4o-mini"
+LLM_TEMPERATURE = 0.7
+LLM_MAX_TOKENS = 4000
+
+# The most tokens the prompt of one report section can have (None means no limit). Bigger sections are made
+# smaller: repeated options are joined, the smallest answers are added up into "Outros" and long labels are shortened.
+# Answer labels longer than LLM_LABEL_MAX_CHARS are always shortened.
+LLM_SECTION_TOKEN_BUDGET = 1500
+LLM_LABEL_MAX_CHARS = 80
+
+# How many report sections go in one LLM request (answered as one JSON object), and the most tokens that answer
+# can have. 1 asks for each section in its own request. Sections missing from an answer are asked again one by one.
+LLM_BATCH_SIZE = 10
+LLM_BATCH_MAX_TOKENS = 12000
+
+# The limits of our LLM account, so we wait our turn instead of being refused: requests per minute
+# and tokens per minute (the prompt plus LLM_MAX_TOKENS, like the provider counts them). None means no limit.
+LLM_RPM = 500
+LLM_TPM = 200000
+
+# Each try of a request gets at most LLM_TIMEOUT_SECONDS, and all the tries of one request together
+# at most LLM_DEADLINE_SECONDS. After "too many requests" or a server error we try again up to
+# LLM_MAX_RETRIES times, waiting a random time up to LLM_BACKOFF_SECONDS * 2, 4, 8... (at most LLM_BACKOFF_MAX_SECONDS).
+LLM_TIMEOUT_SECONDS = 60
+LLM_DEADLINE_SECONDS = 180
+LLM_MAX_RETRIES = 5
+LLM_BACKOFF_SECONDS = 0.5
+LLM_BACKOFF_MAX_SECONDS = 30
+
+# LLM answers are kept in CACHE_DIR and reused when the very same prompt (and model settings) comes up again.
+# Answers older than LLM_CACHE_TTL_DAYS are asked again (None keeps them forever), and the cache
+# never grows over LLM_CACHE_MAX_MB (the least recently used answers are thrown away first).
+LLM_CACHE_TTL_DAYS = 30
+LLM_CACHE_MAX_MB = 50
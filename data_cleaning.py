@@ -1,39 +1,115 @@
 # This file helps us clean up messy answers so we can count and understand them better.
 
+import numpy as np
 import pandas as pd 
+from pandas.api.types import infer_dtype, is_object_dtype
 from config import MULTIPLE_SEPARATOR, TOP_N, OTHERS_LABEL
 
+# This function tells if a column holds text in one of the compact types
+# (pandas "string" or "category"), see ANSWER_DTYPE in config.py
+def is_text_dtype(dtype) -> bool:
+    return isinstance(dtype, (pd.StringDtype, pd.CategoricalDtype))
+
 # This function cleans up answers where people picked only one thing
 def clean_single(series: pd.Series) -> pd.Series:
-    # Go through each answer:
-    # - If it's empty or just spaces, throw it away
-    # - If it's a string, remove extra spaces
-    s = series.apply(
-        lambda x: None if (pd.isna(x) or (isinstance(x, str) and x.strip() == "")) else (x.strip() if isinstance(x, str) else x)
-    )
-    
-    # Remove all the empty ones
-    return s.dropna()
-
-# This function handles answers where people picked multiple things
-def expand_multiple(series: pd.Series, sep=MULTIPLE_SEPARATOR) -> pd.Series:
-    
-    # Split each answer into smaller pieces
-    def split_cell(x):
-        if pd.isna(x):  # If it's empty, return nothing
-            return []
-        
-        if isinstance(x, str):  # If it's a string, split by the separator (like ";")
-            parts = [p.strip() for p in x.split(sep)]
-            return [p for p in parts if p != ""]
-        
-        return [x]  # If it's not a string, just return it as-is
-
-    # Break all the answers into pieces and flatten them into one big list
-    exploded = series.apply(split_cell).explode()
-
-    # Remove any leftover empty pieces
-    return exploded[exploded.notna()]
+    s, keep = clean_single_values(series)
+    return match_apply_dtype(s, bool(keep.all()))
+
+# This function does the cleaning of clean_single, but doesn't fix the type of the result yet.
+# It also says which rows were kept (not empty and not just spaces).
+def clean_single_values(series: pd.Series):
+    # An empty text column has nothing to clean
+    if isinstance(series.dtype, pd.StringDtype) and len(series) == 0:
+        return series, np.ones(0, dtype=bool)
+
+    # Columns with only numbers (or dates) have nothing to strip: just drop the empty ones
+    if not (is_object_dtype(series.dtype) or is_text_dtype(series.dtype)):
+        keep = series.notna().to_numpy(dtype=bool)
+        return series[keep], keep
+
+    # Surveys repeat the same few answers a lot, so we clean each DIFFERENT answer only once
+    # and then copy the result to every row (empty cells get the extra last slot)
+    codes, uniques = pd.factorize(series.astype(object))
+    codes = np.where(codes < 0, len(uniques), codes)
+
+    is_text = np.array([isinstance(u, str) for u in uniques] + [False], dtype=bool)
+    cleaned = np.empty(len(uniques) + 1, dtype=object)
+    cleaned[:-1] = [u.strip() if isinstance(u, str) else u for u in uniques]
+    dropped = np.array([isinstance(c, str) and c == "" for c in cleaned[:-1]] + [True], dtype=bool)
+
+    # Text answers get their stripped version, everything else stays as it was
+    values = np.where(is_text[codes], cleaned[codes], series.to_numpy(dtype=object))
+
+    # Keep the answers that are not empty and not just spaces
+    keep = ~dropped[codes]
+    return pd.Series(values, index=series.index, name=series.name)[keep], keep
+
+# This function picks the type of cleaned answers like pandas does after an .apply():
+# e.g. whole numbers become decimals (1.0) if some answers were thrown away (complete=False)
+def match_apply_dtype(s: pd.Series, complete: bool) -> pd.Series:
+    if len(s) == 0:
+        return s if complete else s.astype(object)
+
+    kind = infer_dtype(s, skipna=False)
+    if kind == "integer":
+        return s.astype("int64" if complete else "float64")
+    if kind in ("floating", "mixed-integer-float"):
+        return s.astype("float64")
+    if kind == "boolean" and complete:
+        return s.astype(bool)
+    if kind == "datetime":
+        return s.astype("datetime64[ns]")
+    return s
+
+# This function handles answers where people picked multiple things.
+# With return_matrix=True it also gives back a table with one row per person and one
+# column per option (True if the person picked it), so nobody has to split the text again.
+def expand_multiple(series: pd.Series, sep=MULTIPLE_SEPARATOR, return_matrix: bool = False):
+
+    # Split each DIFFERENT answer only once (empty cells get the extra last slot)
+    codes, uniques = pd.factorize(series.astype(object))
+    codes = np.where(codes < 0, len(uniques), codes)
+
+    pieces = []
+    for u in uniques:
+        if isinstance(u, str):
+            # Split by the separator (like ";"), remove spaces and empty pieces
+            parts = [p.strip() for p in u.split(sep)]
+            pieces.append([p for p in parts if p != ""])
+        else:
+            # If it's not text, it's a single answer
+            pieces.append([u])
+    pieces.append([])
+
+    # Where the pieces of each different answer start in one flat list
+    lengths = np.array([len(p) for p in pieces], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    flat = np.empty(int(lengths.sum()), dtype=object)
+    flat[:] = [p for parts in pieces for p in parts]
+
+    # Repeat each row once per piece, and find which piece goes where
+    row_lengths = lengths[codes]
+    rows = np.repeat(np.arange(len(series)), row_lengths)
+    first_out = np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+    values = flat[np.repeat(starts[codes], row_lengths) + (np.arange(len(rows)) - first_out)]
+
+    # Answers that weren't text are kept exactly as they were in the cell
+    is_text = np.array([isinstance(u, str) for u in uniques] + [True], dtype=bool)
+    not_text = ~is_text[codes[rows]]
+    values[not_text] = series.to_numpy(dtype=object)[rows[not_text]]
+
+    exploded = pd.Series(values, index=series.index[rows], name=series.name, dtype=object)
+
+    if not return_matrix:
+        return exploded
+
+    # One column per option, in the order they first show up
+    option_codes, options = pd.factorize(exploded)
+    picked = np.zeros((len(series), len(options)), dtype=bool)
+    picked[rows, option_codes] = True
+    matrix = pd.DataFrame(picked, index=series.index, columns=list(options)).astype(pd.SparseDtype(bool, False))
+
+    return exploded, matrix
 
 # This function keeps only the top answers and puts the rest into a group called "Outros"
 def cap_top_n_with_outros(counts: pd.Series, n: int = TOP_N, outros_label: str = OTHERS_LABEL) -> pd.Series:
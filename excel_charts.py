@@ -0,0 +1,45 @@
+# This file puts real Excel charts (made by Excel itself) into the summary sheets,
+# pointing at the percentages we already wrote there. No pictures are drawn or saved.
+
+from config import PIE_COLORS, BAR_COLOR
+
+# How many rows of the sheet a chart takes
+EXCEL_CHART_ROWS = 15
+
+# This function adds a pie (4 answers or fewer) or bar chart next to a question.
+# The answers and percentages are in columns A and B, from first_row to last_row, in the order of pct_excel.
+# pct is in the order the picture charts use, so each answer keeps the same color.
+def insert_excel_chart(workbook, ws, ws_name: str, pct, pct_excel, first_row: int, last_row: int):
+    categories = [ws_name, first_row, 0, last_row, 0]
+    values = [ws_name, first_row, 1, last_row, 1]
+
+    if len(pct) <= 4:
+        # Same colors as the picture pies: the biggest answer gets the first color
+        color_of = {answer: PIE_COLORS[i % len(PIE_COLORS)] for i, answer in enumerate(pct.index)}
+        points = [{"fill": {"color": color_of[answer]}, "border": {"color": "white"}} for answer in pct_excel.index]
+
+        chart = workbook.add_chart({"type": "pie"})
+        chart.add_series({
+            "categories": categories,
+            "values": values,
+            "points": points,
+            "data_labels": {"category": True, "value": True, "num_format": "0.0%", "position": "outside_end"},
+        })
+    else:
+        # Horizontal bars, the biggest answer on top and "Outros" at the bottom
+        chart = workbook.add_chart({"type": "bar"})
+        chart.add_series({
+            "categories": categories,
+            "values": values,
+            "fill": {"color": BAR_COLOR},
+            "border": {"none": True},
+            "data_labels": {"value": True, "num_format": "0.0%"},
+        })
+        chart.set_y_axis({"reverse": True})
+        chart.set_x_axis({"name": "Porcentagem (%)", "num_format": "0%", "major_gridlines": {"visible": False}})
+
+    chart.set_title({"none": True})
+    chart.set_legend({"none": True})
+
+    # Put the chart to the right of the answers (column D)
+    ws.insert_chart(first_row - 1, 3, chart, {"x_offset": 10})
@@ -1,11 +1,11 @@
 import os, re
-import pandas as pd
-from docx import Document
-from docx.shared import Inches
-from ai_integration import ask_ai, get_report_building_prompt, get_section_analyzer_prompt
-from config import INPUT_XLSX, LLM_FEATURES_ON, CONTROL_SHEET_NAME, GROUP_BY_COL_INDEX, GENERAL_LABEL, OUTPUT_DIR
+from ai_integration import ask_ai, ask_ai_sections, get_report_building_prompt
+from config import INPUT_XLSX, LLM_FEATURES_ON, GROUP_BY_COL_INDEX, GENERAL_LABEL, OUTPUT_DIR, LLM_CONCURRENCY
 from llm_prompts import LLM_OUTPUT_SIMPLE, LLM_OUTPUT_BY_GROUPS, LLM_OUTPUT_SECTION_ANALYSIS
-from summarizer import chart_data_map
+from llm_cache import finish_llm_cache
+from llm_client import print_rate_limit_summary
+from llm_providers import print_llm_provider_summary
+from results_registry import results_registry, load_chart_manifest
 
 # Parses the LLM output in Markdown into DOCX paraghraphs
 def add_markdown_paragraph(doc, text):
@@ -37,60 +37,96 @@ def add_markdown_paragraph(doc, text):
         else:
             run.text = token
 
-# This function inserts the chart for a given column into the document
-def insert_chart_for_column(doc, col_letter):
-    for fname in os.listdir(OUTPUT_DIR):
-        if f"_column{col_letter}.jpg" in fname:
-            chart_path = os.path.join(OUTPUT_DIR, fname)
-            doc.add_picture(chart_path, width=Inches(5.5))
-            return True
-    return False
+# This function inserts the chart of a question into the document.
+# chart_paths is {column letter: chart path} of the group of the report (see load_chart_manifest).
+def insert_chart_for_column(doc, col_letter, chart_paths):
+    chart_path = chart_paths.get(col_letter)
+    if chart_path is None or not os.path.exists(chart_path):
+        return False
 
-# This function generates a .DOCX report by leveraging LLM
-def generate_diagnosis_report():
-    # Load Excel to detect grouping
-    df_full = pd.read_excel(INPUT_XLSX, sheet_name=CONTROL_SHEET_NAME, header=1)
+    # Word can't hold SVG or WebP pictures, so we point to the file instead
+    if chart_path.endswith((".svg", ".webp")):
+        doc.add_paragraph(f"(Gráfico: {chart_path})")
+    else:
+        from docx.shared import Inches
+        doc.add_picture(chart_path, width=Inches(5.5))
+    return True
+
+# This function generates a .DOCX report by leveraging LLM.
+# LLM answers are reused from the cache (see llm_cache.py) unless use_cache is False.
+# "headers" are the questions of the sheet, when the caller already has them (e.g. main.py --stream,
+# which never loads the whole sheet); without them, the sheet is loaded to find them.
+def generate_diagnosis_report(use_cache: bool = True, headers: list = None):
+    # The results of every sheet, and which chart picture belongs to which (group, column).
+    # Run on its own, they come from the chart manifest saved by main.py.
+    chart_paths = load_chart_manifest()
+    if not results_registry.results():
+        raise RuntimeError("there are no results to write the reports from (run main.py first)")
 
     # Get outline once
-    prompt = get_report_building_prompt()
+    prompt = get_report_building_prompt(headers)
     #print(f"LLM PROMPT:\n{prompt}\n")
 
     # Gets the output from LLM
     if LLM_FEATURES_ON:
         print("Sending prompt to LLM for report outline...")
-        outline = ask_ai(prompt)
+        outline = ask_ai(prompt, use_cache)
+        if outline is None:
+            raise RuntimeError("the LLM didn't answer the report outline prompt")
         #print(f"\n LLM Output:{outline}\n")
     else:
         print("LLM disabled, using offline output")
         outline = LLM_OUTPUT_BY_GROUPS
 
-    # If we want to split by groups (like schools or cities), we do that here
-    if GROUP_BY_COL_INDEX is None:
-        # Single global report
-        build_report(outline, GENERAL_LABEL)
-    
-    else:
-        # Always create the general report first
-        build_report(outline, GENERAL_LABEL)
+    # Always create the general report first
+    group_labels = [GENERAL_LABEL]
+
+    # If we want to split by groups (like schools or cities), one report per group main.py wrote a sheet for
+    if GROUP_BY_COL_INDEX is not None:
+        group_labels += [label for label in results_registry.group_labels() if label != GENERAL_LABEL]
+
+    # The sections of every report are analyzed all at the same time, then the reports are saved in order
+    build_reports(outline, [(group_label, chart_paths.get(group_label, {})) for group_label in group_labels], use_cache)
+
+    # Say how many answers came from the cache (or the recordings) and how often we were slowed down,
+    # and keep the cache under its limits
+    finish_llm_cache()
+    print_rate_limit_summary()
+    print_llm_provider_summary()
+
+# This class holds a report whose sections were written, but whose analyses are still missing.
+# Each analysis goes into an empty paragraph left at the end of its section.
+class PendingReport:
+
+    def __init__(self, doc, group_label: str):
+        self.doc = doc
+        self.group_label = group_label
 
-        # One report per group
-        group_col_name = df_full.columns[GROUP_BY_COL_INDEX]
-        groups_df = df_full[df_full[group_col_name].notna() & (df_full[group_col_name] != "")]
-        unique_groups = groups_df[group_col_name].unique().tolist()
+        # (empty paragraph, section name, section data) for each section with charts
+        self.analyses = []
 
-        for g in unique_groups:
-            group_label = str(g).strip() or "Unknown"
-            build_report(outline, group_label)
+# This function writes the headings, texts and charts of one group's report from the outline,
+# leaving an empty paragraph for the analysis of each section. chart_paths is {column letter: chart path} of that group.
+def plan_report(outline, group_label, chart_paths=None) -> PendingReport:
+    chart_paths = chart_paths or {}
 
-def build_report(outline, group_label):
     print("Creating report outline...")
 
+    # python-docx is only imported once there's a report to write
+    from docx import Document
     doc = Document()
     doc.add_heading(f"Relatório — {group_label}", level=0)
+    report = PendingReport(doc, group_label)
 
     current_section = None
     current_cols = []
 
+    # Leave room for the analysis of the section we just finished
+    def flush_section():
+        if current_section and current_cols:
+            section_data = {c: results_registry.percentages(group_label, c) for c in current_cols}
+            report.analyses.append((doc.add_paragraph(), current_section, section_data))
+
     for line in outline.split("\n"):
         if not line.strip():
             continue
@@ -100,17 +136,7 @@ def build_report(outline, group_label):
         # --- Section headers
         if clean_line.startswith("## "):
             # Before starting a new section, flush previous one
-            if current_section and current_cols:
-                section_data = {c: chart_data_map.get(c, {}) for c in current_cols}
-            
-                if LLM_FEATURES_ON:
-                    print(f"Analyzing section '{current_section}'...")
-                    analysis_text = ask_ai(get_section_analyzer_prompt(current_section, section_data))
-                else:
-                    print("LLM disabled, using offline output")
-                    analysis_text = LLM_OUTPUT_SECTION_ANALYSIS
-
-                doc.add_paragraph(analysis_text)
+            flush_section()
 
             # Start new section
             current_section = clean_line.replace("##", "").strip()
@@ -134,23 +160,52 @@ def build_report(outline, group_label):
             col_match = re.match(r"[-•\s]*\*{0,2}([A-Z]{1,3})\*{0,2}\s*[:—\-–]", clean_line)
             if col_match:
                 col_letter = col_match.group(1)
-                if insert_chart_for_column(doc, col_letter):
+                insert_chart_for_column(doc, col_letter, chart_paths)
+
+                # The section is analyzed from the answers, with or without a chart picture (e.g. --chart-output excel)
+                if results_registry.get(group_label, col_letter) is not None:
                     current_cols.append(col_letter)
 
     # --- Flush last section
-    if current_section and current_cols:
-        section_data = {c: chart_data_map.get(c, {}) for c in current_cols}
-        
-        if LLM_FEATURES_ON:
-            print(f"Analyzing section '{current_section}'...")
-            analysis_text = ask_ai(get_section_analyzer_prompt(current_section, section_data))
+    flush_section()
 
-        else:
-            print("LLM disabled, using offline output")
-            analysis_text = LLM_OUTPUT_SECTION_ANALYSIS
-            
-        doc.add_paragraph(analysis_text)
+    return report
+
+# This function builds the reports of several groups. "groups" is a list of (group label, chart_paths).
+# The analyses of every section of every report are asked to the LLM at the same time, several sections per
+# request (see ask_ai_sections, at most LLM_CONCURRENCY waiting at once), then each report is completed and saved, in order.
+def build_reports(outline, groups, use_cache: bool = True):
+    reports = [plan_report(outline, group_label, chart_paths) for group_label, chart_paths in groups]
+    sections = [(report.group_label, section_name, section_data) for report in reports for _, section_name, section_data in report.analyses]
 
+    if LLM_FEATURES_ON:
+        print(f"Analyzing {len(sections)} sections of {len(reports)} reports, up to {LLM_CONCURRENCY} requests at a time...")
+        analyses = iter(ask_ai_sections(sections, use_cache=use_cache))
+    else:
+        print("LLM disabled, using offline output")
+        analyses = iter([LLM_OUTPUT_SECTION_ANALYSIS] * len(sections))
+
+    missing = 0
+    for report in reports:
+        for paragraph, _, _ in report.analyses:
+            analysis_text = next(analyses)
+            if analysis_text is None:
+                # The LLM couldn't answer: leave the section without analysis instead of an error message
+                paragraph._element.getparent().remove(paragraph._element)
+                missing += 1
+            else:
+                paragraph.text = analysis_text
+        save_report(report.doc, report.group_label)
+
+    if missing:
+        print(f"Warning: {missing} section analyses are missing from the reports because the LLM couldn't answer them.")
+
+# This function builds the report of one group. chart_paths is {column letter: chart path} of that group.
+def build_report(outline, group_label, chart_paths=None):
+    build_reports(outline, [(group_label, chart_paths)])
+
+# This function saves the report of one group
+def save_report(doc, group_label):
     # build the report path
     base_name = os.path.splitext(os.path.basename(INPUT_XLSX))[0]
     safe_group = re.sub(r"[^\w\-]+", "_", group_label)
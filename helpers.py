@@ -1,7 +1,5 @@
 import re
 import textwrap
-import pandas as pd
-from config import INPUT_XLSX, CONTROL_SHEET_NAME
 
 # This function makes sure our Excel sheet names are clean and not too long
 def sanitize_sheet_name(name, existing):
@@ -56,13 +54,16 @@ def wrap_labels(labels, wrap_width=50, max_chars=150):
         wrapped.append('\n'.join(textwrap.wrap(label, wrap_width)))
     return wrapped
 
-# This function returns the questions list and column ID
-def get_question_list():
-    headers_df = pd.read_excel(INPUT_XLSX, sheet_name=CONTROL_SHEET_NAME, header=1, nrows=0)
-    questions = list(headers_df.columns)
+# This function returns the questions list and column ID.
+# "headers" are the questions of the sheet; without them, the whole sheet is loaded to find them.
+def get_question_list(headers: list = None):
+    if headers is None:
+        # Imported here because survey_loader also uses the helpers above
+        from survey_loader import get_survey_workbook
+        headers = get_survey_workbook().headers
 
     question_list = []
-    for idx, q in enumerate(questions):
+    for idx, q in enumerate(headers):
         col_letter = colnum_to_excel(idx)
         question_list.append(f"{col_letter} — {q}")
     return "\n".join(question_list)
\ No newline at end of file
@@ -0,0 +1,120 @@
+# This file keeps the answers of the LLM on disk (in a small SQLite database in CACHE_DIR),
+# named after everything that was sent: the prompt, the model, the temperature and max_tokens.
+# When the very same request comes up again, even in another run, we reuse the answer instead of asking again.
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from config import CACHE_DIR, LLM_CACHE_TTL_DAYS, LLM_CACHE_MAX_MB
+
+# Bump this if the way we ask changes, so old answers are ignored
+LLM_CACHE_VERSION = 1
+
+# The database with the cached answers
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_responses.sqlite")
+
+# This function builds the name of an answer in the cache: a hash of everything that changes it
+def llm_cache_key(prompt: str, model: str, temperature: float, max_tokens: int) -> str:
+    content = {
+        "version": LLM_CACHE_VERSION,
+        "prompt": prompt,
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    text = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# This class is the cache of LLM answers. It counts how many answers it found (hits)
+# and how many it didn't (misses) since it was opened.
+class LLMResponseCache:
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_days: float = LLM_CACHE_TTL_DAYS, max_mb: float = LLM_CACHE_MAX_MB):
+        self.path = path
+        self.ttl_seconds = ttl_days * 24 * 60 * 60 if ttl_days is not None else None
+        self.max_mb = max_mb
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    # This function gives back the cached answer, or None if we don't have it (or it's too old)
+    def get(self, key: str):
+        row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+
+        if row is None or (self.ttl_seconds is not None and now - row[1] > self.ttl_seconds):
+            self.misses += 1
+            return None
+
+        # Mark it as recently used, so it's the last one to be thrown away
+        self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        self.hits += 1
+        return row[0]
+
+    # This function saves an answer we just got
+    def put(self, key: str, response: str):
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, response, len(response.encode("utf-8")), now, now),
+        )
+        self._db.commit()
+
+    # This function throws away the answers older than the TTL, then the least recently used ones
+    # until the cache fits in max_mb
+    def prune(self):
+        if self.ttl_seconds is not None:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        max_bytes = self.max_mb * 1024 * 1024
+        if total > max_bytes:
+            # Oldest first
+            to_delete = []
+            for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                if total <= max_bytes:
+                    break
+                to_delete.append((key,))
+                total -= size
+            self._db.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+# The cache of this run, opened the first time it's needed
+_llm_cache = None
+
+# This function gives back the cache of LLM answers, opening it the first time
+def get_llm_cache() -> LLMResponseCache:
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
+
+# This function prints how many LLM answers came from the cache, and keeps the cache under its limits
+def finish_llm_cache():
+    if _llm_cache is None:
+        return
+    print(f"LLM cache: {_llm_cache.hits} hits, {_llm_cache.misses} misses")
+    _llm_cache.prune()
+
+# This function deletes every cached LLM answer
+def clear_llm_cache():
+    global _llm_cache
+    if _llm_cache is not None:
+        _llm_cache.close()
+        _llm_cache = None
+    if os.path.exists(LLM_CACHE_PATH):
+        os.remove(LLM_CACHE_PATH)
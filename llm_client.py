@@ -0,0 +1,161 @@
+# This file sends requests to the LLM without running into the provider's limits:
+# it waits its turn (requests per minute and tokens per minute), tries again after "too many requests"
+# or server errors (waiting a bit longer each time, with some randomness so requests don't retry together),
+# and gives up when a request takes longer than its deadline.
+# It works with any provider: "send" is the function that makes ONE try (see openai_module.py).
+
+import time
+import random
+import asyncio
+import threading
+from config import LLM_RPM, LLM_TPM, LLM_MAX_TOKENS, LLM_TIMEOUT_SECONDS, LLM_DEADLINE_SECONDS
+from config import LLM_MAX_RETRIES, LLM_BACKOFF_SECONDS, LLM_BACKOFF_MAX_SECONDS
+from prompt_budget import count_tokens
+
+# The error we raise when the LLM couldn't answer (after all the tries, or because the request was refused)
+class LLMRequestError(Exception):
+    pass
+
+# This class lets "per_minute" units (requests or tokens) through per minute.
+# It starts full, so a minute's worth can go at once, then fills up again little by little.
+class TokenBucket:
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # This function takes "amount" units now and gives back how many seconds to wait before using them.
+    # Taking them right away (even if it leaves the bucket in debt) keeps the order of who asked first.
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            # A request bigger than the whole bucket would never fit, so it waits for a full bucket
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+# This class holds the requests-per-minute and tokens-per-minute buckets (None turns one off)
+class RateLimiter:
+
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+        # How many times the provider said "too many requests" or failed, and how long we waited our turn
+        self.throttled = 0
+        self.retries = 0
+        self.waited_seconds = 0.0
+
+    # This function gives back how many seconds to wait before sending a request of "tokens" tokens
+    def reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        self.waited_seconds += wait
+        return wait
+
+# This function guesses how many tokens a request uses, the way providers count them for their limits:
+# the prompt plus the most the answer can have
+def estimate_request_tokens(prompt: str, max_tokens: int = LLM_MAX_TOKENS) -> int:
+    return count_tokens(prompt) + max_tokens
+
+# This function gives back how long to wait before try number "attempt" (1, 2, 3...):
+# a random time up to LLM_BACKOFF_SECONDS * 2^attempt (never more than LLM_BACKOFF_MAX_SECONDS),
+# but at least what the provider asked for (Retry-After)
+def backoff_seconds(attempt: int, retry_after: float = None) -> float:
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_SECONDS * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+# The limits shared by every request of this run, made the first time they're needed
+_rate_limiter = None
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+# This function prints how often the LLM requests were slowed down in this run
+def print_rate_limit_summary():
+    if _rate_limiter is None:
+        return
+    print(f"LLM requests: {_rate_limiter.retries} retries ({_rate_limiter.throttled} rate limited), "
+          f"{_rate_limiter.waited_seconds:.1f}s waiting for our turn")
+
+# This class follows the tries of one request: the deadline, how many tries are left and why the last one failed
+class _Attempts:
+
+    def __init__(self, prompt: str, limiter: RateLimiter, deadline: float, retry_info, max_tokens: int):
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.limiter = limiter
+        self.retry_info = retry_info
+        self.deadline = deadline
+        self.ends_at = time.monotonic() + deadline
+        self.attempt = 0
+
+    def remaining(self) -> float:
+        return self.ends_at - time.monotonic()
+
+    # This function gives back how long to wait for our turn, failing if it goes past the deadline
+    def turn_wait(self) -> float:
+        wait = self.limiter.reserve(estimate_request_tokens(self.prompt, self.max_tokens))
+        if wait >= self.remaining():
+            raise LLMRequestError(f"Rate limits would make the request miss its {self.deadline:g}s deadline")
+        return wait
+
+    # This function gives back the timeout of the next try (what's left of the deadline, at most LLM_TIMEOUT_SECONDS)
+    def timeout(self) -> float:
+        return max(0.1, min(LLM_TIMEOUT_SECONDS, self.remaining()))
+
+    # This function decides what to do after a failed try: gives back how long to wait before trying again,
+    # or raises LLMRequestError if the error can't be fixed by trying again, or there are no tries or time left
+    def after_failure(self, error: Exception) -> float:
+        retryable, retry_after = self.retry_info(error)
+        if not retryable:
+            raise LLMRequestError(f"The LLM refused the request: {error}") from error
+
+        self.attempt += 1
+        self.limiter.retries += 1
+        if getattr(error, "status_code", None) == 429:
+            self.limiter.throttled += 1
+
+        if self.attempt > LLM_MAX_RETRIES:
+            raise LLMRequestError(f"The LLM still failed after {LLM_MAX_RETRIES} retries: {error}") from error
+
+        delay = backoff_seconds(self.attempt, retry_after)
+        if delay >= self.remaining():
+            raise LLMRequestError(f"The request would miss its {self.deadline:g}s deadline: {error}") from error
+        return delay
+
+# This function sends one prompt with send(prompt, timeout), respecting the limits and trying again when it makes sense.
+# retry_info(error) says whether an error is worth another try, and how long the provider asked us to wait (or None).
+# max_tokens is the most the answer can have (it counts for the tokens-per-minute limit).
+# It gives back the answer, or raises LLMRequestError.
+def call_llm(send, retry_info, prompt: str, limiter: RateLimiter = None, deadline: float = LLM_DEADLINE_SECONDS,
+             max_tokens: int = LLM_MAX_TOKENS) -> str:
+    attempts = _Attempts(prompt, limiter or get_rate_limiter(), deadline, retry_info, max_tokens)
+    while True:
+        time.sleep(attempts.turn_wait())
+        try:
+            return send(prompt, attempts.timeout())
+        except Exception as e:
+            time.sleep(attempts.after_failure(e))
+
+# Same as call_llm, for "send" functions that run in the asyncio event loop (waiting doesn't block the other requests)
+async def call_llm_async(send, retry_info, prompt: str, limiter: RateLimiter = None, deadline: float = LLM_DEADLINE_SECONDS,
+                         max_tokens: int = LLM_MAX_TOKENS) -> str:
+    attempts = _Attempts(prompt, limiter or get_rate_limiter(), deadline, retry_info, max_tokens)
+    while True:
+        await asyncio.sleep(attempts.turn_wait())
+        try:
+            return await send(prompt, attempts.timeout())
+        except Exception as e:
+            await asyncio.sleep(attempts.after_failure(e))
@@ -0,0 +1,156 @@
+# This file chooses who answers the LLM prompts. Every provider has the same few methods:
+#   generate(prompt, max_tokens, timeout, json_output)  -> the answer (one try, see llm_client.py for the retries)
+#   open_session(max_connections)                        -> what "async with" opens to send many prompts at the same time
+#   generate_async(session, prompt, max_tokens, timeout, json_output)
+#   retry_info(error)                                    -> (worth another try?, seconds the provider asked us to wait)
+# and says if its answers go in the LLM cache (uses_cache).
+#
+# Besides OpenAI (openai_module.py), a recorder saves every prompt and its answer in a JSON Lines file,
+# and a replayer answers from that file without any network, so the whole report can be timed offline.
+
+import os
+import json
+import time
+import asyncio
+import contextlib
+from config import LLM_PROVIDER, LLM_RECORDINGS_PATH, LLM_REPLAY_LATENCY_SECONDS, LLM_MODEL, LLM_TEMPERATURE
+from config import LLM_MAX_TOKENS, LLM_TIMEOUT_SECONDS, LLM_CONCURRENCY
+from llm_cache import llm_cache_key
+
+# The error of a prompt that was never recorded (trying again doesn't help)
+class NotRecordedError(LookupError):
+    pass
+
+# This function names a prompt in the recordings, with the settings it's sent with (like the LLM cache does)
+def recording_key(prompt: str, max_tokens: int) -> str:
+    return llm_cache_key(prompt, LLM_MODEL, LLM_TEMPERATURE, max_tokens)
+
+# This function reads the recordings file into {key: answer} (the last answer of a prompt wins)
+def load_recordings(path: str) -> dict:
+    recordings = {}
+    if not os.path.exists(path):
+        return recordings
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                recordings[entry["key"]] = entry["response"]
+    return recordings
+
+# This class asks another provider and writes down every prompt and its answer in a JSON Lines file.
+# Its answers don't come from the LLM cache: a cached prompt would be missing from the recordings.
+class RecordingProvider:
+    name = "record"
+    uses_cache = False
+
+    def __init__(self, provider, path: str = LLM_RECORDINGS_PATH):
+        self.provider = provider
+        self.path = path
+        self.recorded = 0
+
+    def _save(self, prompt: str, max_tokens: int, response: str):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        entry = {"key": recording_key(prompt, max_tokens), "prompt": prompt, "response": response}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.recorded += 1
+
+    def generate(self, prompt: str, max_tokens: int = LLM_MAX_TOKENS, timeout: float = LLM_TIMEOUT_SECONDS,
+                 json_output: bool = False) -> str:
+        response = self.provider.generate(prompt, max_tokens=max_tokens, timeout=timeout, json_output=json_output)
+        self._save(prompt, max_tokens, response)
+        return response
+
+    def open_session(self, max_connections: int = LLM_CONCURRENCY):
+        return self.provider.open_session(max_connections)
+
+    async def generate_async(self, session, prompt: str, max_tokens: int = LLM_MAX_TOKENS,
+                             timeout: float = LLM_TIMEOUT_SECONDS, json_output: bool = False) -> str:
+        response = await self.provider.generate_async(session, prompt, max_tokens=max_tokens, timeout=timeout, json_output=json_output)
+        self._save(prompt, max_tokens, response)
+        return response
+
+    def retry_info(self, error: Exception):
+        return self.provider.retry_info(error)
+
+# This class answers from the recordings, waiting "latency" seconds per answer like a real provider would.
+# A prompt that was never recorded fails (it's never retried).
+class ReplayProvider:
+    name = "replay"
+    uses_cache = False
+
+    def __init__(self, path: str = LLM_RECORDINGS_PATH, latency: float = LLM_REPLAY_LATENCY_SECONDS):
+        self.path = path
+        self.latency = latency
+        self.recordings = load_recordings(path)
+        self.replayed = 0
+        self.not_recorded = 0
+
+    def _answer(self, prompt: str, max_tokens: int) -> str:
+        response = self.recordings.get(recording_key(prompt, max_tokens))
+        if response is None:
+            self.not_recorded += 1
+            raise NotRecordedError(f"the prompt isn't in {self.path} (record it with LLM_PROVIDER = \"record\")")
+        self.replayed += 1
+        return response
+
+    def generate(self, prompt: str, max_tokens: int = LLM_MAX_TOKENS, timeout: float = LLM_TIMEOUT_SECONDS,
+                 json_output: bool = False) -> str:
+        time.sleep(self.latency)
+        return self._answer(prompt, max_tokens)
+
+    # Nothing to open: the answers are already in memory
+    def open_session(self, max_connections: int = LLM_CONCURRENCY):
+        return contextlib.nullcontext()
+
+    async def generate_async(self, session, prompt: str, max_tokens: int = LLM_MAX_TOKENS,
+                             timeout: float = LLM_TIMEOUT_SECONDS, json_output: bool = False) -> str:
+        await asyncio.sleep(self.latency)
+        return self._answer(prompt, max_tokens)
+
+    def retry_info(self, error: Exception):
+        return False, None
+
+# The OpenAI provider needs config_api.py and the OpenAI SDK, so it's only imported when it's used
+def _openai_provider():
+    from openai_module import OpenAIProvider
+    return OpenAIProvider()
+
+# The providers, by name: each one is a function that makes it
+LLM_PROVIDERS = {
+    "openai": _openai_provider,
+    "record": lambda: RecordingProvider(_openai_provider()),
+    "replay": lambda: ReplayProvider(),
+}
+
+# This function adds a provider (or replaces one) under a name, to be chosen with LLM_PROVIDER or --llm-provider
+def register_llm_provider(name: str, make_provider):
+    LLM_PROVIDERS[name] = make_provider
+
+# This function makes the provider called "name"
+def make_llm_provider(name: str):
+    if name not in LLM_PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{name}' (choose one of: {', '.join(LLM_PROVIDERS)})")
+    return LLM_PROVIDERS[name]()
+
+# The provider of this run, made the first time it's needed
+_llm_provider = None
+
+def get_llm_provider():
+    global _llm_provider
+    if _llm_provider is None:
+        _llm_provider = make_llm_provider(LLM_PROVIDER)
+    return _llm_provider
+
+# This function makes every prompt of this run go to "provider" (a name or a provider)
+def set_llm_provider(provider):
+    global _llm_provider
+    _llm_provider = make_llm_provider(provider) if isinstance(provider, str) else provider
+
+# This function prints what the recorder or the replayer did in this run
+def print_llm_provider_summary():
+    if isinstance(_llm_provider, RecordingProvider):
+        print(f"LLM recorder: {_llm_provider.recorded} answers saved in {_llm_provider.path}")
+    elif isinstance(_llm_provider, ReplayProvider):
+        print(f"LLM replayer: {_llm_provider.replayed} answers replayed, {_llm_provider.not_recorded} prompts not recorded")
@@ -3,121 +3,192 @@
 
 import os  
 import shutil
+import argparse
 import pandas as pd
-from config import INPUT_XLSX, OUTPUT_XLSX, CONTROL_SHEET_NAME, GROUP_BY_COL_INDEX, QTYPE_CLOSED, GENERAL_LABEL, LLM_FEATURES_ON, OUTPUT_DIR
-from summarizer import summarize_df_to_excel_and_charts
-
-# Make a folder called "charts" to save our pictures (if it doesn't exist yet)
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# Clean up any old charts before saving new ones
-for filename in os.listdir(OUTPUT_DIR):
-    file_path = os.path.join(OUTPUT_DIR, filename)
-    try:
-        if os.path.isfile(file_path) or os.path.islink(file_path):
-            os.unlink(file_path) #Remove file or symlink
-    except Exception as e:
-        print(f"Failed to delete {file_path}. Reason: {e}")
-
-# Open the Excel file that has all the answers
-xls = pd.ExcelFile(INPUT_XLSX)
-
-# If the sheet with answers isn't there, stop and shout!
-if CONTROL_SHEET_NAME not in xls.sheet_names:
-    raise ValueError(f"Sheet '{CONTROL_SHEET_NAME}' not found in workbook.")
-
-# Read the first row (row 1) to see what kind of question each column is
-ctrl_row = pd.read_excel(INPUT_XLSX, sheet_name=CONTROL_SHEET_NAME, header=None, nrows=1)
-
-# Read the second row (row 2) to get the column names
-headers_df = pd.read_excel(INPUT_XLSX, sheet_name=CONTROL_SHEET_NAME, header=1, nrows=0)
-control_headers = list(headers_df.columns)
-
-# Make a map that says: "This column is this kind of question"
-control_map = {}
-for i, col_name in enumerate(control_headers):
-    
-    # Get the keyword from the control row (like FECHADA or MULTIPLA)
-    kw = ctrl_row.iloc[0, i] if i < ctrl_row.shape[1] else None
-    
-    # If it's empty, we say it's a closed question (FECHADA)
-    if pd.isna(kw):
-        kw = QTYPE_CLOSED
-    
-    # Save the keyword in our map
-    control_map[col_name] = str(kw).strip().upper()
-
-# Now read all the real answers from the sheet (starting from row 2)
-df_full = pd.read_excel(INPUT_XLSX, sheet_name=CONTROL_SHEET_NAME, header=1)
-
-# We open a new Excel file to write our results
-with pd.ExcelWriter(OUTPUT_XLSX, engine="xlsxwriter") as writer:
-    workbook = writer.book
-
-    # First, we make a summary for everyone together (called "geral")
-    summarize_df_to_excel_and_charts(
-        df=df_full,
-        writer=writer,
-        workbook=workbook,
-        sheet_label=GENERAL_LABEL,
-        control_map=control_map
-    )
-
-    # If we want to split by groups (like schools or cities), we do that here
-    if GROUP_BY_COL_INDEX is not None:
-        
-        # Make sure the group column index is not too big
-        if GROUP_BY_COL_INDEX >= len(df_full.columns):
-            raise IndexError(f"GROUP_BY_COL_INDEX {GROUP_BY_COL_INDEX} out of range for sheet '{CONTROL_SHEET_NAME}'")
-
-        # Get the name of the column we want to group by
-        group_col_name = df_full.columns[GROUP_BY_COL_INDEX]
-
-        # Clean up the group names (remove spaces and empty ones)
-        groups_df = df_full.copy()
-        if groups_df[group_col_name].dtype == object:
-            groups_df[group_col_name] = groups_df[group_col_name].astype(str).str.strip()
-        groups_df = groups_df[groups_df[group_col_name].notna()]
-        groups_df = groups_df[groups_df[group_col_name] != ""]
-
-        # Get a list of all the different groups
-        unique_groups = groups_df[group_col_name].unique().tolist()
-
-        # For each group, make a separate summary and chart
-        for g in unique_groups:
-            df_g = groups_df[groups_df[group_col_name] == g]
-            group_label = str(g).strip() or "Unknown"
-            summarize_df_to_excel_and_charts(
-                df=df_g,
-                writer=writer,
-                workbook=workbook,
-                sheet_label=group_label,
-                control_map=control_map
-            )
-
-# Use LLM to generate a report based on the questions
-if LLM_FEATURES_ON:
-    try:
-        from generate_report import generate_diagnosis_report
-        generate_diagnosis_report()
-    
-    except Exception as e:
-        print(f"Failed to generate report: {e}")
-
-else:
-    print("Skipping LLM report generation (RUN_REPORT_GENERATION=False).")
-
-# Formatting the filename for the ZIP file
-print("Packaging charts and reports into ZIP...")
-base_name = os.path.splitext(os.path.basename(INPUT_XLSX))[0]
-zip_path = os.path.join(OUTPUT_DIR, f"{base_name}.zip")
-
-# Remove any existing zip file
-if os.path.exists(zip_path):
-    os.remove(zip_path)
-
-# Create a ZIP file with all charts
-shutil.make_archive(zip_path.replace(".zip", ""), 'zip', OUTPUT_DIR)
-
-# Tell the user where we saved the zip file
-print(f"Done! Saved Excel to {OUTPUT_XLSX}, charts to '{OUTPUT_DIR}/', and zip to {zip_path}")
\ No newline at end of file
+from config import INPUT_XLSX, OUTPUT_XLSX, CONTROL_SHEET_NAME, GROUP_BY_COL_INDEX, GENERAL_LABEL, LLM_FEATURES_ON, LLM_PROVIDER, OUTPUT_DIR, ANSWER_DTYPE, CHART_WORKERS, CHART_OUTPUT, EXCEL_CONSTANT_MEMORY, SUMMARY_WORKERS
+from summarizer import summarize_counts_to_excel_and_charts, summarize_counts, summarize_counts_in_parallel, write_summary_sheet
+from chart_utils import render_chart_jobs
+from survey_loader import get_survey_workbook
+from survey_cache import clear_survey_cache
+from chart_cache import clear_chart_cache, prune_chart_cache
+from llm_cache import clear_llm_cache
+from llm_providers import LLM_PROVIDERS, set_llm_provider
+from survey_stream import stream_survey_counts
+from run_manifest import RunManifest, run_settings, load_run_manifest, save_run_manifest, clear_run_manifest, answer_hashes, merge_questions
+from results_registry import save_chart_manifest
+from run_manifest import GENERAL_KEY, group_key
+
+# Command line switches (e.g. python main.py --no-cache)
+parser = argparse.ArgumentParser(description="Summarize the survey answers into Excel, charts and reports.")
+parser.add_argument("--no-cache", action="store_true", help="parse the Excel file, recompute every question, draw every chart and ask the LLM again, without reading or writing the caches")
+parser.add_argument("--clear-cache", action="store_true", help="delete the cached survey, charts, LLM answers and the manifest of the last run before running")
+parser.add_argument("--stream", action="store_true", help="read very large sheets row by row, keeping only the running counts in memory")
+parser.add_argument("--answer-dtype", choices=["category", "string[pyarrow]"], default=ANSWER_DTYPE, help="keep the text answers in a compact type to use less memory")
+parser.add_argument("--constant-memory", action="store_true", default=EXCEL_CONSTANT_MEMORY, help="write the Excel file row by row to disk instead of keeping it in memory")
+parser.add_argument("--chart-output", choices=["image", "excel", "both"], default=CHART_OUTPUT, help="save chart pictures, put native charts in the Excel file, or both")
+parser.add_argument("--summary-workers", type=int, default=SUMMARY_WORKERS, help="how many processes summarize the groups (default: every CPU core, 1 = one by one)")
+parser.add_argument("--full", action="store_true", help="recompute every question of every sheet, even the ones whose answers didn't change since the last run")
+parser.add_argument("--llm-provider", choices=list(LLM_PROVIDERS), default=LLM_PROVIDER, help="who answers the LLM prompts: OpenAI, OpenAI while recording the answers, or the recorded answers (offline)")
+parser.add_argument("--chart-workers", type=int, default=CHART_WORKERS, help="how many processes draw the charts (default: every CPU core, 1 = one by one)")
+
+# This function runs everything, from reading the answers to packing the ZIP file.
+# The charts are drawn by helper processes, which import this file too, so nothing can run at import time.
+def main():
+    args = parser.parse_args()
+
+    # Throw away the cached survey, charts, LLM answers and what the last run computed if we were asked to
+    if args.clear_cache:
+        clear_survey_cache()
+        clear_chart_cache()
+        clear_llm_cache()
+        clear_run_manifest()
+
+    # Make a folder called "charts" to save our pictures (if it doesn't exist yet)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # Clean up any old charts before saving new ones
+    for filename in os.listdir(OUTPUT_DIR):
+        file_path = os.path.join(OUTPUT_DIR, filename)
+        try:
+            if os.path.isfile(file_path) or os.path.islink(file_path):
+                os.unlink(file_path) #Remove file or symlink
+        except Exception as e:
+            print(f"Failed to delete {file_path}. Reason: {e}")
+
+    # The charts are only collected while we write the sheets, and drawn all together at the end
+    chart_jobs = []
+
+    # The questions of the sheet, for the report prompt (only known up front when streaming)
+    headers = None
+
+    # We open a new Excel file to write our results
+    with pd.ExcelWriter(OUTPUT_XLSX, engine="xlsxwriter", engine_kwargs={"options": {"constant_memory": args.constant_memory}}) as writer:
+        workbook = writer.book
+
+        if args.stream:
+            # Read the sheet chunk by chunk and keep only the counts (for very big files)
+            streamed = stream_survey_counts()
+            headers = streamed.headers
+
+            # First, we make a summary for everyone together (called "geral")
+            summarize_counts_to_excel_and_charts(streamed.general_counts, streamed.headers, writer, workbook, GENERAL_LABEL, streamed.control_map, chart_jobs, args.chart_output)
+
+            # Then a separate summary and chart for each group
+            for g in streamed.groups:
+                group_label = str(g).strip() or "Unknown"
+                summarize_counts_to_excel_and_charts(streamed.group_counts[g], streamed.headers, writer, workbook, group_label, streamed.control_map, chart_jobs, args.chart_output)
+
+        else:
+            # Read the spreadsheet a single time. Everyone else (reports, prompts) reuses this same copy.
+            survey = get_survey_workbook(use_cache=not args.no_cache, answer_dtype=args.answer_dtype)
+
+            # The map that says: "This column is this kind of question"
+            control_map = survey.control_map
+
+            # All the real answers from the sheet (starting from row 2)
+            df_full = survey.df
+
+            # Find the group column, if we want to split by groups (like schools or cities)
+            group_col_name = None
+            if GROUP_BY_COL_INDEX is not None:
+
+                # Make sure the group column index is not too big
+                if GROUP_BY_COL_INDEX >= len(df_full.columns):
+                    raise IndexError(f"GROUP_BY_COL_INDEX {GROUP_BY_COL_INDEX} out of range for sheet '{CONTROL_SHEET_NAME}'")
+
+                # Get the name of the column we want to group by
+                group_col_name = df_full.columns[GROUP_BY_COL_INDEX]
+
+            # Clean and split every answer a single time, into one long table (one line per answer).
+            # Every sheet below is counted from this table.
+            facts = survey.answer_facts(group_col_name)
+
+            # Hash the answers behind every (sheet, question), and find what changed since the last run.
+            # Only those are counted and summarized again; the rest comes from the last run (unless --full).
+            settings = run_settings(survey.path, survey.sheet_name, GROUP_BY_COL_INDEX, facts.columns, control_map)
+            # With --no-cache, the manifest is neither read nor written (like --full, without saving)
+            previous = None if args.full or args.no_cache else load_run_manifest(settings)
+            manifest = RunManifest(settings)
+            counted = facts.counted_columns()
+            letters = [facts.letters[col] for col in counted]
+            general_hashes, group_hashes = answer_hashes(df_full, facts.letters, counted, facts.row_groups, len(facts.groups))
+
+            def changed_columns(sheet_key, hashes):
+                if previous is None:
+                    return set(counted)
+                changed = previous.changed_letters(sheet_key, hashes)
+                return {col for col in counted if facts.letters[col] in changed}
+
+            # First, we make a summary for everyone together (called "geral")
+            changed = changed_columns(GENERAL_KEY, general_hashes)
+            new_questions = summarize_counts(facts.general_counts(only=changed), facts.columns, control_map) if changed else []
+            questions = merge_questions(previous, GENERAL_KEY, letters, new_questions)
+            manifest.record(GENERAL_KEY, general_hashes, questions)
+            write_summary_sheet(questions, writer, workbook, GENERAL_LABEL, chart_jobs, args.chart_output)
+            recomputed = len(changed)
+
+            # Then a separate summary and chart for each group (empty group names are left out)
+            if group_col_name is not None:
+                changed_by_group = [changed_columns(group_key(g), hashes) for g, hashes in zip(facts.groups, group_hashes)]
+                recomputed += sum(len(changed) for changed in changed_by_group)
+
+                # Count every question that changed in at least one group, all groups at once,
+                # then keep for each group only the questions that changed there
+                all_changed = set().union(*changed_by_group)
+                group_counts = facts.group_counts(only=all_changed) if all_changed else [{} for _ in facts.groups]
+                todo = [{col: counts[col] for col in changed} for counts, changed in zip(group_counts, changed_by_group) if changed]
+
+                # The math of every group runs in several processes; the sheets are written here, in order
+                summaries = summarize_counts_in_parallel(todo, facts.columns, control_map, workers=args.summary_workers)
+                for g, hashes, changed in zip(facts.groups, group_hashes, changed_by_group):
+                    new_questions = next(summaries) if changed else []
+                    questions = merge_questions(previous, group_key(g), letters, new_questions)
+                    manifest.record(group_key(g), hashes, questions)
+
+                    group_label = str(g).strip() or "Unknown"
+                    write_summary_sheet(questions, writer, workbook, group_label, chart_jobs, args.chart_output)
+
+            total = len(counted) * (1 + (len(facts.groups) if group_col_name is not None else 0))
+            print(f"Recomputed {recomputed} of {total} (sheet, question) pairs; the rest didn't change since the last run.")
+            if not args.no_cache:
+                save_run_manifest(manifest)
+
+    # Draw all the charts, several at the same time
+    render_chart_jobs(chart_jobs, workers=args.chart_workers, use_cache=not args.no_cache)
+
+    # Keep the chart cache under its size limit
+    prune_chart_cache()
+
+    # Write down which chart belongs to which (group, column), so the reports find them right away
+    save_chart_manifest()
+
+    # Use LLM to generate a report based on the questions
+    if LLM_FEATURES_ON:
+        try:
+            set_llm_provider(args.llm_provider)
+            from generate_report import generate_diagnosis_report
+            generate_diagnosis_report(use_cache=not args.no_cache, headers=headers)
+
+        except Exception as e:
+            print(f"Failed to generate report: {e}")
+
+    else:
+        print("Skipping LLM report generation (RUN_REPORT_GENERATION=False).")
+
+    # Formatting the filename for the ZIP file
+    print("Packaging charts and reports into ZIP...")
+    base_name = os.path.splitext(os.path.basename(INPUT_XLSX))[0]
+    zip_path = os.path.join(OUTPUT_DIR, f"{base_name}.zip")
+
+    # Remove any existing zip file
+    if os.path.exists(zip_path):
+        os.remove(zip_path)
+
+    # Create a ZIP file with all charts
+    shutil.make_archive(zip_path.replace(".zip", ""), 'zip', OUTPUT_DIR)
+
+    # Tell the user where we saved the zip file
+    print(f"Done! Saved Excel to {OUTPUT_XLSX}, charts to '{OUTPUT_DIR}/', and zip to {zip_path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,97 @@
 import os
-from openai import OpenAI
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
 from config_api import OPENAI_API_KEY
+from config import OPENAI_BASE_URL, LLM_MODEL, LLM_TEMPERATURE, LLM_MAX_TOKENS, LLM_TIMEOUT_SECONDS, LLM_CONCURRENCY
 
-# Create client safely (uses env var for API key)
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Keep the connections open between requests (at most one per request running at the same time).
+# The tries are made by llm_client.py, so the SDK must not try again by itself.
+def _http_limits(max_connections: int) -> httpx.Limits:
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
 
-def generate_response(prompt: str, model: str = "gpt-4o-mini") -> str:
+# The client of generate_response, made the first time a prompt is sent (not when this file is imported)
+_client = None
+
+def get_client() -> OpenAI:
+    global _client
+    if _client is None:
+        # Create client safely (uses env var for API key)
+        _client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0,
+                         http_client=openai.DefaultHttpxClient(limits=_http_limits(LLM_CONCURRENCY), timeout=LLM_TIMEOUT_SECONDS))
+    return _client
+
+def generate_response(prompt: str, model: str = LLM_MODEL, temperature: float = LLM_TEMPERATURE, max_tokens: int = LLM_MAX_TOKENS,
+                      timeout: float = LLM_TIMEOUT_SECONDS, json_output: bool = False) -> str:
     """
     Sends a prompt to OpenAI API and returns the text response.
+    With json_output, the model must answer with a JSON object (the prompt has to ask for one too).
+    """
+    extra = {"response_format": {"type": "json_object"}} if json_output else {}
+    response = get_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+        temperature=temperature,
+        timeout=timeout,
+        **extra
+    )
+    return response.choices[0].message.content.strip()
+
+# This function makes a client for sending many prompts at the same time.
+# Use it with "async with", inside the event loop that sends the prompts.
+def make_async_client(max_connections: int = LLM_CONCURRENCY) -> AsyncOpenAI:
+    return AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0,
+                       http_client=openai.DefaultAsyncHttpxClient(limits=_http_limits(max_connections), timeout=LLM_TIMEOUT_SECONDS))
+
+async def generate_response_async(async_client: AsyncOpenAI, prompt: str, model: str = LLM_MODEL,
+                                  temperature: float = LLM_TEMPERATURE, max_tokens: int = LLM_MAX_TOKENS,
+                                  timeout: float = LLM_TIMEOUT_SECONDS, json_output: bool = False) -> str:
+    """
+    Same as generate_response, but waits for the answer without blocking the other prompts.
     """
-    response = client.chat.completions.create(
+    extra = {"response_format": {"type": "json_object"}} if json_output else {}
+    response = await async_client.chat.completions.create(
         model=model,
         messages=[{"role": "user", "content": prompt}],
-        max_tokens=4000,
-        temperature=0.7
+        max_tokens=max_tokens,
+        temperature=temperature,
+        timeout=timeout,
+        **extra
     )
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+    return response.choices[0].message.content.strip()
+
+# This function says if an OpenAI error is worth another try ("too many requests", server errors,
+# lost connections and timeouts), and how many seconds OpenAI asked us to wait (Retry-After, or None)
+def retry_info(error: Exception):
+    if isinstance(error, openai.APIConnectionError):
+        return True, None
+
+    if isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500):
+        try:
+            retry_after = float(error.response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            retry_after = None
+        return True, retry_after
+
+    return False, None
+
+# This class is the OpenAI provider of llm_providers.py
+class OpenAIProvider:
+    name = "openai"
+    uses_cache = True
+
+    def generate(self, prompt: str, max_tokens: int = LLM_MAX_TOKENS, timeout: float = LLM_TIMEOUT_SECONDS,
+                 json_output: bool = False) -> str:
+        return generate_response(prompt, max_tokens=max_tokens, timeout=timeout, json_output=json_output)
+
+    # The session is the async client, so its connections are shared by the prompts sent together
+    def open_session(self, max_connections: int = LLM_CONCURRENCY) -> AsyncOpenAI:
+        return make_async_client(max_connections)
+
+    async def generate_async(self, session: AsyncOpenAI, prompt: str, max_tokens: int = LLM_MAX_TOKENS,
+                             timeout: float = LLM_TIMEOUT_SECONDS, json_output: bool = False) -> str:
+        return await generate_response_async(session, prompt, max_tokens=max_tokens, timeout=timeout, json_output=json_output)
+
+    def retry_info(self, error: Exception):
+        return retry_info(error)
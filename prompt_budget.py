@@ -0,0 +1,110 @@
+# This file counts the tokens of a prompt on this computer (without asking the LLM),
+# and shrinks the data of a report section until its prompt fits in a token budget.
+
+import re
+from functools import lru_cache
+from config import LLM_MODEL, OTHERS_LABEL
+
+# Words, numbers and single punctuation marks
+_TEXT_PIECES = re.compile(r"\w+|[^\w\s]")
+
+# This function gives back tiktoken's encoding for a model, or None if tiktoken isn't there
+# (or can't load the encoding, e.g. without internet the first time).
+# tiktoken counts exactly like OpenAI does. It's optional: without it, we estimate.
+# It's imported the first time we count, not when this file is imported.
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        return None
+
+    # A model tiktoken doesn't know: count like the newest OpenAI models
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+# This function counts the tokens of a text. Without tiktoken, it estimates:
+# about one token per 4 letters of each word or number, and one per punctuation mark.
+def count_tokens(text: str, model: str = LLM_MODEL) -> int:
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return sum(-(-len(piece) // 4) for piece in _TEXT_PIECES.findall(text))
+
+# This function shortens a label to max_chars (with "…" at the end), after squeezing its spaces
+def _truncate_label(label, max_chars: int) -> str:
+    label = " ".join(str(label).split())
+    return label if len(label) <= max_chars else label[:max_chars - 1].rstrip() + "…"
+
+# This function joins the answers that are the same option written differently (case and spaces),
+# adding up their percentages, and shortens the long ones. Different answers that look the same
+# once shortened get a number, so they're never mixed up.
+def _clean_answers(answers: dict, max_chars: int) -> dict:
+    joined = {}
+    names = {}
+    for answer, pct in answers.items():
+        key = " ".join(str(answer).split()).casefold()
+        if key in names:
+            joined[names[key]] += pct
+        else:
+            names[key] = answer
+            joined[answer] = pct
+
+    cleaned = {}
+    for answer, pct in joined.items():
+        label = _truncate_label(answer, max_chars)
+        number = 2
+        while label in cleaned:
+            label = f"{_truncate_label(answer, max_chars)} ({number})"
+            number += 1
+        cleaned[label] = pct
+    return cleaned
+
+# This function keeps the "keep" biggest answers and adds up the rest into "Outros"
+def _merge_tail(answers: dict, keep: int) -> dict:
+    others = answers.get(OTHERS_LABEL, 0.0)
+    ranked = sorted(((answer, pct) for answer, pct in answers.items() if answer != OTHERS_LABEL), key=lambda item: -item[1])
+    if len(ranked) <= keep:
+        return dict(answers)
+
+    merged = dict(ranked[:keep])
+    merged[OTHERS_LABEL] = others + sum(pct for _, pct in ranked[keep:])
+    return merged
+
+# This function shrinks the data of a section ({column: {answer: percentage}}) until render(data)
+# fits in max_tokens tokens: first it joins repeated options and shortens long labels, then (if it's still
+# too big) it adds up the smallest answers of each question into "Outros", then it shortens the labels more.
+# Columns whose data isn't a dict of answers are kept as they are.
+def compact_section_data(data: dict, max_tokens: int, render, label_max_chars: int) -> dict:
+    def each_question(change, source):
+        return {col: change(answers) if isinstance(answers, dict) else answers for col, answers in source.items()}
+
+    def fits(candidate):
+        return count_tokens(render(candidate)) <= max_tokens
+
+    compact = each_question(lambda answers: _clean_answers(answers, label_max_chars), data)
+    if fits(compact):
+        return compact
+
+    # Fewer and fewer answers per question
+    most = max((len(answers) for answers in compact.values() if isinstance(answers, dict)), default=0)
+    for keep in range(most - 1, 0, -1):
+        candidate = each_question(lambda answers: _merge_tail(answers, keep), compact)
+        if fits(candidate):
+            return candidate
+        compact = candidate
+
+    # Shorter and shorter labels
+    for max_chars in (label_max_chars // 2, label_max_chars // 4):
+        compact = each_question(lambda answers: _clean_answers(answers, max_chars), compact)
+        if fits(compact):
+            break
+    return compact
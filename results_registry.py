@@ -0,0 +1,109 @@
+# This file keeps the results of every summary sheet in memory while the program runs:
+# for each group (or "Geral") and each question, the counts, the percentages and the chart picture.
+# The reports read from here, so they never have to count the answers again.
+# They're also saved in CACHE_DIR at the end of main.py, so generate_report.py can run on its own later.
+
+import os
+import json
+import pandas as pd
+from config import CACHE_DIR
+
+# The chart manifest: the percentages of every (group, column) and its chart picture. It lives in CACHE_DIR next to
+# the run manifest (see run_manifest.py), so it's never packed in the ZIP file with the charts.
+CHART_MANIFEST_PATH = os.path.join(CACHE_DIR, "chart_manifest.json")
+
+# This class holds the results of one question in one sheet
+class QuestionResult:
+
+    def __init__(self, group_label: str, col_letter: str, col, counts: pd.Series, pct: pd.Series, chart_path: str = None):
+        self.group_label = group_label
+        self.col_letter = col_letter
+        self.col = col
+
+        # Top answers with "Outros", as counts and as percentages (in the order the charts use)
+        self.counts = counts
+        self.pct = pct
+
+        # Where the chart picture was saved (None if no picture was made)
+        self.chart_path = chart_path
+
+# This class holds the results of every sheet, found by (group label, column letter)
+class ResultsRegistry:
+
+    def __init__(self):
+        self._results = {}
+
+    # This function saves the results of one question of one sheet (replacing older ones)
+    def add(self, result: QuestionResult):
+        self._results[(result.group_label, result.col_letter)] = result
+
+    # This function gives back the results of one question of one sheet, or None
+    def get(self, group_label: str, col_letter: str):
+        return self._results.get((group_label, col_letter))
+
+    # This function gives back {answer: percentage} of one question of one sheet ({} if there is none)
+    def percentages(self, group_label: str, col_letter: str) -> dict:
+        result = self.get(group_label, col_letter)
+        return result.pct.to_dict() if result is not None else {}
+
+    # This function gives back every result, in the order they were added
+    def results(self) -> list:
+        return list(self._results.values())
+
+    # This function gives back {group label: {column letter: chart path}} of every chart picture we made
+    def chart_paths(self) -> dict:
+        paths = {}
+        for (group_label, col_letter), result in self._results.items():
+            if result.chart_path is not None:
+                paths.setdefault(group_label, {})[col_letter] = result.chart_path
+        return paths
+
+    # This function lists the sheets we have results for, in the order they were written
+    def group_labels(self) -> list:
+        return list(dict.fromkeys(group_label for group_label, _ in self._results))
+
+    # This function forgets everything (e.g. before a new run in the same process)
+    def clear(self):
+        self._results.clear()
+
+# The results of this run. The summarizer fills it, the reports read it.
+results_registry = ResultsRegistry()
+
+# This function turns a Series into [[answer, value], ...], with plain Python values (the answers keep their type)
+def _pairs(series: pd.Series) -> list:
+    return [list(pair) for pair in zip(series.index.tolist(), series.tolist())]
+
+# This function turns [[answer, value], ...] back into a Series
+def _series(pairs: list) -> pd.Series:
+    return pd.Series([value for _, value in pairs], index=[answer for answer, _ in pairs], dtype=float if pairs else object)
+
+# This function saves the results of every (group, column): the counts, the percentages and the chart picture,
+# in the order they were written, for the reports
+def save_chart_manifest(registry: ResultsRegistry = results_registry, path: str = CHART_MANIFEST_PATH):
+    entries = [
+        {"group": result.group_label, "letter": result.col_letter, "col": str(result.col),
+         "counts": _pairs(result.counts), "pct": _pairs(result.pct), "chart_path": result.chart_path}
+        for result in registry.results()
+    ]
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"results": entries}, f, ensure_ascii=False, indent=1, default=str)
+    except OSError as e:
+        print(f"Failed to save chart manifest. Reason: {e}")
+
+# This function gives back {group label: {column letter: chart path}}. If this run made no results
+# (e.g. generate_report.py run on its own), the registry is filled first from the chart manifest of the last run.
+def load_chart_manifest(registry: ResultsRegistry = results_registry, path: str = CHART_MANIFEST_PATH) -> dict:
+    if not registry.results() and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)["results"]
+            for entry in entries:
+                registry.add(QuestionResult(entry["group"], entry["letter"], entry["col"], _series(entry["counts"]),
+                                            _series(entry["pct"]), entry["chart_path"]))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            registry.clear()
+            print(f"Ignoring unreadable chart manifest. Reason: {e}")
+
+    return registry.chart_paths()
@@ -0,0 +1,155 @@
+# This file remembers what the last run computed, so the next run only redoes what changed.
+# For every sheet (everyone, and each group) and every question, it keeps a hash of the answers
+# that went into it, and the summary we computed from them (top answers and percentages).
+# If a new run finds the same hash, it reuses the old summary instead of computing it again.
+
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+from config import CACHE_DIR, TOP_N, OTHERS_LABEL, MULTIPLE_SEPARATOR
+from results_registry import CHART_MANIFEST_PATH
+
+# Bump this if the way we compute the summaries changes, so old manifests are ignored
+MANIFEST_VERSION = 2
+
+# The manifest (hashes, easy to read) and the summaries it points to. They live in CACHE_DIR,
+# so they're never packed in the ZIP file with the outputs.
+MANIFEST_PATH = os.path.join(CACHE_DIR, "run_manifest.json")
+RESULTS_PATH = os.path.join(CACHE_DIR, "run_results.pkl")
+
+# Key of the sheet with everyone together
+GENERAL_KEY = "general"
+
+# This function gives the key of a group's sheet. repr() keeps 1 and "1" apart.
+def group_key(group) -> str:
+    return f"group:{group!r}"
+
+# This class holds the hashes and summaries of one run
+class RunManifest:
+
+    def __init__(self, settings: dict, hashes: dict = None, results: dict = None):
+        self.settings = settings
+
+        # {sheet key: {column letter: hash}} and {sheet key: {column letter: QuestionSummary}}
+        self.hashes = hashes or {}
+        self.results = results or {}
+
+    # This function gives back the summary saved for a question, if its answers didn't change
+    def reusable(self, sheet_key: str, letter: str, answers_hash: str):
+        if self.hashes.get(sheet_key, {}).get(letter) != answers_hash:
+            return None
+        return self.results.get(sheet_key, {}).get(letter)
+
+    # This function lists the questions of a sheet whose answers changed since this run (or are new)
+    def changed_letters(self, sheet_key: str, hashes: dict) -> set:
+        return {letter for letter, answers_hash in hashes.items() if self.reusable(sheet_key, letter, answers_hash) is None}
+
+    # This function records the summaries of one sheet
+    def record(self, sheet_key: str, hashes: dict, questions: list):
+        self.hashes[sheet_key] = dict(hashes)
+        self.results[sheet_key] = {q.col_letter: q for q in questions}
+
+# This function puts the new summaries of a sheet together with the ones reused from the last run,
+# in the order of the sheet ("letters"). Without a last run, everything must be new.
+def merge_questions(previous, sheet_key: str, letters: list, new_questions: list) -> list:
+    new_by_letter = {q.col_letter: q for q in new_questions}
+    old_by_letter = previous.results.get(sheet_key, {}) if previous is not None else {}
+    return [new_by_letter[letter] if letter in new_by_letter else old_by_letter[letter] for letter in letters]
+
+# This function describes everything besides the answers that changes the summaries.
+# If any of it changes, nothing from the last run is reused.
+def run_settings(path: str, sheet_name: str, group_col_index, columns: list, control_map: dict) -> dict:
+    return {
+        "version": MANIFEST_VERSION,
+        "input": os.path.abspath(path),
+        "sheet_name": sheet_name,
+        "group_col_index": group_col_index,
+        "top_n": TOP_N,
+        "others_label": OTHERS_LABEL,
+        "separator": MULTIPLE_SEPARATOR,
+        "columns": [str(col) for col in columns],
+        "control_types": [control_map.get(col) for col in columns],
+    }
+
+# This function loads the manifest of the last run.
+# It returns None if there is none, or if it was made with other settings.
+def load_run_manifest(settings: dict):
+    if not (os.path.exists(MANIFEST_PATH) and os.path.exists(RESULTS_PATH)):
+        return None
+
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("settings") != settings:
+            return None
+
+        with open(RESULTS_PATH, "rb") as f:
+            results = pickle.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable run manifest. Reason: {e}")
+        return None
+
+    return RunManifest(settings, meta.get("hashes", {}), results)
+
+# This function saves the manifest in CACHE_DIR
+def save_run_manifest(manifest: RunManifest):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+        # Summaries first and the JSON last, so a half-written manifest is never used
+        with open(RESULTS_PATH, "wb") as f:
+            pickle.dump(manifest.results, f)
+
+        text = json.dumps({"settings": manifest.settings, "hashes": manifest.hashes}, ensure_ascii=False)
+        with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+            f.write(text)
+    except (OSError, TypeError, ValueError, pickle.PicklingError) as e:
+        print(f"Failed to save run manifest. Reason: {e}")
+
+# This function deletes the manifest of the last run (and the chart manifest saved with it, see results_registry.py)
+def clear_run_manifest():
+    for path in (MANIFEST_PATH, RESULTS_PATH, CHART_MANIFEST_PATH):
+        try:
+            if os.path.exists(path):
+                os.unlink(path)
+        except OSError as e:
+            print(f"Failed to delete {path}. Reason: {e}")
+
+# This function gives every row of a column a hash of its value.
+# The type is part of it, so changing 1 into "1" (or 1.0) counts as a change.
+def _row_hashes(series: pd.Series) -> np.ndarray:
+    codes, uniques = pd.factorize(series.astype(object))
+
+    # One hash per DIFFERENT value (empty cells get the extra last slot)
+    value_hashes = [hashlib.sha1(f"{type(u).__name__}:{u!r}".encode("utf-8")).digest()[:8] for u in uniques]
+    value_hashes.append(b"\0" * 8)
+    table = np.frombuffer(b"".join(value_hashes), dtype=np.uint64)
+
+    return table[np.where(codes < 0, len(uniques), codes)]
+
+# This function hashes, for each question, the answers of everyone and the answers of each group
+# (in row order, empty cells included). row_groups says which group (0, 1, 2...) each row is in, -1 if none.
+# It gives back ({column letter: hash}, [{column letter: hash} for each group]).
+def answer_hashes(df: pd.DataFrame, letters: dict, columns: list, row_groups: np.ndarray, n_groups: int):
+    general = {}
+    by_group = [{} for _ in range(n_groups)]
+
+    # Put the rows of each group together, keeping their order
+    order = np.argsort(row_groups, kind="stable")
+    sorted_groups = row_groups[order]
+    starts = np.searchsorted(sorted_groups, np.arange(n_groups), side="left")
+    ends = np.searchsorted(sorted_groups, np.arange(n_groups), side="right")
+
+    for col in columns:
+        letter = letters[col]
+        hashes = _row_hashes(df[col])
+        general[letter] = hashlib.sha256(hashes.tobytes()).hexdigest()
+
+        grouped = hashes[order]
+        for g in range(n_groups):
+            by_group[g][letter] = hashlib.sha256(grouped[starts[g]:ends[g]].tobytes()).hexdigest()
+
+    return general, by_group
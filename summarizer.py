@@ -2,125 +2,212 @@
 # counts them, makes charts, and writes everything into a new Excel file.
 
 import os
+import weakref
 import pandas as pd
-from config import OUTPUT_DIR, TOP_N, MULTIPLE_SEPARATOR
-from config import QTYPE_CLOSED, QTYPE_MULTIPLE, QTYPE_OPEN, QTYPE_IGNORE, OTHERS_LABEL
+from concurrent.futures import ProcessPoolExecutor
+from config import OUTPUT_DIR, TOP_N, CHART_FORMAT, CHART_OUTPUT, SUMMARY_WORKERS
+from config import QTYPE_CLOSED, QTYPE_MULTIPLE, OTHERS_LABEL
 from helpers import sanitize_sheet_name, sanitize_filename, colnum_to_excel
-from data_cleaning import clean_single, expand_multiple, cap_top_n_with_outros, to_percentages
-from chart_utils import save_pie_jpg, save_bar_jpg
+from data_cleaning import cap_top_n_with_outros, to_percentages
+from answer_facts import build_answer_facts
+from chart_utils import ChartJob, CHART_PIE, CHART_BAR, render_chart_job
+from excel_charts import insert_excel_chart, EXCEL_CHART_ROWS
+from results_registry import results_registry, QuestionResult
 
 # Counter for how many charts we generated.
 _chart_counter = 1
 
-# Dictionary to store chart data for later AI analysis
-chart_data_map = {}
+# The cell styles of each workbook, so thousands of sheets share the same few formats
+_formats_by_workbook = weakref.WeakKeyDictionary()
+
+# This function gives back the (title, percent, header, note) formats of a workbook, making them the first time
+def _sheet_formats(workbook):
+    if workbook not in _formats_by_workbook:
+        _formats_by_workbook[workbook] = (
+            workbook.add_format({"bold": True}),  # Bold for question titles
+            workbook.add_format({"num_format": "0.00%"}),  # Format for percentages
+            workbook.add_format({"bold": True}),  # Bold for headers
+            workbook.add_format({"italic": True, "font_color": "#666666"}),  # Gray italic for notes
+        )
+    return _formats_by_workbook[workbook]
+
+# This function writes the answers and their percentages, one row each, starting at "row".
+# Column B must already be formatted as percentages (see summarize_counts_to_excel_and_charts).
+# It gives back the first row after the answers.
+def write_answer_rows(ws, row: int, pct_excel: pd.Series) -> int:
+    for answer, p in zip(pct_excel.index, (pct_excel.to_numpy(dtype=float) / 100.0).tolist()):
+        ws.write_row(row, 0, (str(answer), p))
+        row += 1
+    return row
 
 # This function makes one summary sheet and saves charts for each question
-def summarize_df_to_excel_and_charts(df: pd.DataFrame, writer, workbook, sheet_label: str, control_map: dict):
+def summarize_df_to_excel_and_charts(df: pd.DataFrame, writer, workbook, sheet_label: str, control_map: dict, chart_jobs: list = None,
+                                     chart_output: str = CHART_OUTPUT):
+
+    # Count the answers of every question we want to show
+    counts_by_col = build_answer_facts(df, control_map).general_counts()
+
+    summarize_counts_to_excel_and_charts(counts_by_col, list(df.columns), writer, workbook, sheet_label, control_map, chart_jobs, chart_output)
+
+# This class holds everything we need to write one question of a summary sheet.
+# It's small and simple, so it can be sent back from another process.
+class QuestionSummary:
+
+    def __init__(self, col, col_letter: str, ctrl_kw: str, counts: pd.Series = None, pct: pd.Series = None, pct_excel: pd.Series = None):
+        self.col = col
+        self.col_letter = col_letter
+        self.ctrl_kw = ctrl_kw
+
+        # Counts and percentages of the top answers (None if nobody answered),
+        # and the percentages with "Outros" moved to the bottom, as they go into Excel
+        self.counts = counts
+        self.pct = pct
+        self.pct_excel = pct_excel
+
+# This function does all the math of one summary sheet (top answers, "Outros" and percentages),
+# without writing anything. "columns" is the full list of columns of the sheet, so the letters (A, B, C...) stay right.
+# It gives back one QuestionSummary per question we counted, in the order of the sheet.
+def summarize_counts(counts_by_col: dict, columns: list, control_map: dict) -> list:
+    questions = []
+    for col_idx, col in enumerate(columns):
+        # Skip the questions we didn't count (open or ignored ones)
+        if col not in counts_by_col:
+            continue
+
+        # Get column letter like A, B, C...
+        question = QuestionSummary(col, colnum_to_excel(col_idx), control_map.get(col, QTYPE_CLOSED))
+        questions.append(question)
+
+        # Nobody answered: there's nothing to compute
+        counts = counts_by_col[col]
+        if len(counts) == 0:
+            continue
+
+        # Keep only the top answers and group the rest as "Outros"
+        counts_capped = cap_top_n_with_outros(counts, n=TOP_N, outros_label=OTHERS_LABEL)
+
+        # Turn counts into percentages
+        pct = to_percentages(counts_capped)
+
+        # Move "Outros" to the bottom of the list
+        if OTHERS_LABEL in pct.index:
+            outros_val = pct[OTHERS_LABEL]
+            pct_excel = pct.drop(OTHERS_LABEL)
+            pct_excel = pd.concat([pct_excel, pd.Series({OTHERS_LABEL: outros_val})])
+        else:
+            pct_excel = pct
+
+        question.counts = counts_capped
+        question.pct = pct
+        question.pct_excel = pct_excel
+
+    return questions
+
+# This function does the math of many summary sheets (one per group) using several processes.
+# The results come back in the same order as "counts_list", as soon as they are ready,
+# so the sheets can be written one after the other while the rest is still being computed.
+def summarize_counts_in_parallel(counts_list: list, columns: list, control_map: dict, workers=SUMMARY_WORKERS):
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(counts_list) <= 1:
+        for counts_by_col in counts_list:
+            yield summarize_counts(counts_by_col, columns, control_map)
+        return
+
+    print(f"Summarizing {len(counts_list)} groups with {workers} processes...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Bigger batches mean fewer trips between processes
+        chunksize = max(1, len(counts_list) // (workers * 4))
+        yield from pool.map(summarize_counts, counts_list, [columns] * len(counts_list), [control_map] * len(counts_list), chunksize=chunksize)
+
+# This function makes one summary sheet and saves charts from answers that were already counted.
+# "columns" is the full list of columns of the sheet, so the letters (A, B, C...) stay right.
+# If a "chart_jobs" list is given, the charts are added to it to be drawn later (see render_chart_jobs),
+# otherwise they are drawn right away.
+# "chart_output" says which charts to make: "image", "excel" or "both" (see CHART_OUTPUT in config.py).
+def summarize_counts_to_excel_and_charts(counts_by_col: dict, columns: list, writer, workbook, sheet_label: str, control_map: dict,
+                                         chart_jobs: list = None, chart_output: str = CHART_OUTPUT):
+    questions = summarize_counts(counts_by_col, columns, control_map)
+    write_summary_sheet(questions, writer, workbook, sheet_label, chart_jobs, chart_output)
+
+# This function writes one summary sheet (and saves its charts) from questions already summarized.
+# Sheets must be written one at a time, in order, so the sheet names and chart numbers never change.
+def write_summary_sheet(questions: list, writer, workbook, sheet_label: str, chart_jobs: list = None, chart_output: str = CHART_OUTPUT):
     
-    # Set up styles for Excel cells
-    title_fmt   = workbook.add_format({"bold": True})  # Bold for question titles
-    percent_fmt = workbook.add_format({"num_format": "0.00%"})  # Format for percentages
-    header_fmt  = workbook.add_format({"bold": True})  # Bold for headers
-    note_fmt    = workbook.add_format({"italic": True, "font_color": "#666666"})  # Gray italic for notes
+    # Set up styles for Excel cells (made once per workbook, shared by every sheet)
+    title_fmt, percent_fmt, header_fmt, note_fmt = _sheet_formats(workbook)
 
     # Make a clean sheet name that doesn’t break Excel rules
-    ws_name = sanitize_sheet_name(sheet_label, set(writer.sheets.keys()))
+    ws_name = sanitize_sheet_name(sheet_label, writer.sheets)
 
     # Create a new sheet in the Excel file
     ws = workbook.add_worksheet(ws_name)
     writer.sheets[ws_name] = ws
 
+    # Make columns wide enough to read nicely. Answers in column B are shown as percentages
+    # unless a cell says otherwise, so each answer row can be written in a single call.
+    ws.set_column(0, 0, 50)
+    ws.set_column(1, 1, 12, percent_fmt)
+
     # Write the header row
     row = 0
     ws.write(row, 0, "Question / Answer", header_fmt)
     ws.write(row, 1, "Percentage", header_fmt)
     row += 1
 
-    # Go through each column (question) in the data
-    for col in df.columns:
-        # Get column letter like A, B, C...
-        col_letter = colnum_to_excel(df.columns.get_loc(col))  
-
-        ctrl_kw = control_map.get(col, QTYPE_CLOSED)
-
-        # Skip if the question is open or marked to ignore
-        if ctrl_kw in (QTYPE_IGNORE, QTYPE_OPEN):
-            continue
+    # Go through each question of the sheet
+    for question in questions:
+        col, col_letter, ctrl_kw = question.col, question.col_letter, question.ctrl_kw
+        pct, pct_excel = question.pct, question.pct_excel
 
         # Write the question title
         ws.write(row, 0, f"[{col_letter}] {col}", title_fmt)
         #ws.write(row, 0, f"Question: {col}", title_fmt)
         row += 1
 
-        # Clean and count answers based on question type
-        if ctrl_kw == QTYPE_CLOSED:
-            s = clean_single(df[col])
-            if len(s) == 0:
-                ws.write(row, 0, "(no valid responses — all blank/NA)", note_fmt)
-                row += 2
-                continue
-            counts = s.value_counts()
-
-        elif ctrl_kw == QTYPE_MULTIPLE:
-            expanded = expand_multiple(df[col], sep=MULTIPLE_SEPARATOR)
-            if len(expanded) == 0:
+        # If nobody answered, leave a note instead of a chart
+        if pct is None:
+            if ctrl_kw == QTYPE_MULTIPLE:
                 ws.write(row, 0, "(no valid selections — all blank/NA)", note_fmt)
-                row += 2
-                continue
-            counts = expanded.value_counts()
-
-        else:
-            s = clean_single(df[col])
-            if len(s) == 0:
+            else:
                 ws.write(row, 0, "(no valid responses — all blank/NA)", note_fmt)
-                row += 2
-                continue
-            counts = s.value_counts()
-
-        # Keep only the top answers and group the rest as "Outros"
-        counts_capped = cap_top_n_with_outros(counts, n=TOP_N, outros_label=OTHERS_LABEL)
-
-        # Turn counts into percentages
-        pct = to_percentages(counts_capped)
-
-        # Save chart data for later AI analysis
-        chart_data_map[col_letter] = pct.to_dict()
-
-        # Move "Outros" to the bottom of the list
-        if OTHERS_LABEL in pct.index:
-            outros_val = pct[OTHERS_LABEL]
-            pct_excel = pct.drop(OTHERS_LABEL)
-            pct_excel = pd.concat([pct_excel, pd.Series({OTHERS_LABEL: outros_val})])
-        else:
-            pct_excel = pct
+            row += 2
+            continue
 
         # Write each answer and its percentage to the Excel sheet
-        for answer, p in pct_excel.items():
-            ws.write(row, 0, str(answer))
-            ws.write_number(row, 1, float(p) / 100.0, percent_fmt)
-            row += 1
+        first_row = row
+        row = write_answer_rows(ws, row, pct_excel)
+
+        # Excel charts point at the rows we just wrote, and get enough empty rows to fit
+        if chart_output in ("excel", "both"):
+            insert_excel_chart(workbook, ws, ws_name, pct, pct_excel, first_row, row - 1)
+            row = max(row, first_row - 1 + EXCEL_CHART_ROWS)
+
+        if chart_output == "excel":
+            # Save the results for the reports (there's no picture)
+            results_registry.add(QuestionResult(sheet_label, col_letter, col, question.counts, pct))
+            row += 1  # Leave a space before the next question
+            continue
 
         # Save a chart for this question
-        col_letter = colnum_to_excel(df.columns.get_loc(col))  # Get column letter like A, B, C...
         base_name  = sanitize_filename(sheet_label, max_len=50)  # Clean up the sheet name for the file
 
         global _chart_counter # Getting the chart counter
-        chart_path = os.path.join(OUTPUT_DIR, f"{_chart_counter:03d}_{base_name}_column{col_letter}.jpg")
+        chart_path = os.path.join(OUTPUT_DIR, f"{_chart_counter:03d}_{base_name}_column{col_letter}.{CHART_FORMAT}")
         _chart_counter += 1
 
+        # Save the results and the chart path for the reports
+        results_registry.add(QuestionResult(sheet_label, col_letter, col, question.counts, pct, chart_path))
+
         print(f"Creating chart for column '{col}' in sheet '{sheet_label}'...")
 
         # If there are 4 or fewer answers, make a pie chart
-        if len(pct) <= 4:
-            save_pie_jpg(pct, chart_path)
+        job = ChartJob(CHART_PIE if len(pct) <= 4 else CHART_BAR, pct, chart_path)
+        if chart_jobs is None:
+            render_chart_job(job)
         else:
-            save_bar_jpg(pct, chart_path)
+            chart_jobs.append(job)
 
         row += 1  # Leave a space before the next question
 
-    # Make columns wide enough to read nicely
-    ws.set_column(0, 0, 50)
-    ws.set_column(1, 1, 12)
-
     print(f"Finished charts for sheet '{sheet_label}'")
\ No newline at end of file
@@ -0,0 +1,132 @@
+# This file keeps a copy of the parsed survey on disk (in Parquet format),
+# so the next run can skip the slow Excel parsing when the file hasn't changed.
+
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from config import CACHE_DIR
+
+# Bump this if the way we store the cache changes, so old caches are ignored
+CACHE_VERSION = 1
+
+# This function builds the "fingerprint" of a file: where it is, how big it is,
+# when it was last changed and a hash of what's inside
+def file_fingerprint(path: str) -> dict:
+    stat = os.stat(path)
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+
+    return {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "sha256": sha.hexdigest(),
+    }
+
+# This function returns where the cache files for one workbook/sheet live
+def _cache_paths(path: str, sheet_name: str):
+    key = hashlib.sha256(f"{os.path.abspath(path)}|{sheet_name}".encode("utf-8")).hexdigest()[:16]
+    base = os.path.join(CACHE_DIR, f"survey_{key}")
+    return base + ".json", base + ".parquet", base + ".pkl"
+
+# This function loads the answers and control map from the cache.
+# It returns None if there's no cache or if the Excel file changed since we saved it.
+def load_cached_survey(path: str, sheet_name: str):
+    meta_path, parquet_path, pickle_path = _cache_paths(path, sheet_name)
+    if not os.path.exists(meta_path):
+        return None
+
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get("version") != CACHE_VERSION or meta.get("sheet_name") != sheet_name:
+        return None
+
+    # Cheap checks first (size), then the full fingerprint
+    stored = meta.get("fingerprint", {})
+    if stored.get("size") != os.path.getsize(path):
+        return None
+    if stored != file_fingerprint(path):
+        return None
+
+    try:
+        if meta["format"] == "parquet":
+            df = pd.read_parquet(parquet_path)
+
+            # Parquet gives back None for empty text cells; Excel parsing gives NaN
+            for col in df.columns:
+                if df[col].dtype == object:
+                    df[col] = df[col].where(df[col].notna(), np.nan)
+        else:
+            df = pd.read_pickle(pickle_path)
+    except Exception as e:
+        print(f"Ignoring unreadable survey cache. Reason: {e}")
+        return None
+
+    # Put the real question names back
+    headers = meta["headers"]
+    df.columns = headers
+    control_map = dict(zip(headers, meta["control_types"]))
+
+    return df, control_map
+
+# This function saves the answers and control map to the cache
+def save_cached_survey(path: str, sheet_name: str, df: pd.DataFrame, control_map: dict):
+    meta_path, parquet_path, pickle_path = _cache_paths(path, sheet_name)
+    headers = list(df.columns)
+
+    meta = {
+        "version": CACHE_VERSION,
+        "sheet_name": sheet_name,
+        "fingerprint": file_fingerprint(path),
+        "headers": headers,
+        "control_types": [control_map.get(col) for col in headers],
+    }
+
+    # Question names can be anything in Excel, but Parquet wants simple text,
+    # so we store them by position and keep the real names in the JSON file
+    stored = df.copy()
+    stored.columns = [f"c{i}" for i in range(len(headers))]
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+        # Forget the old entry first, so its fingerprint never points at new data
+        if os.path.exists(meta_path):
+            os.unlink(meta_path)
+
+        try:
+            stored.to_parquet(parquet_path, index=True)
+            meta["format"] = "parquet"
+        except Exception:
+            # Columns mixing numbers and text can't go into Parquet, so we keep a pickle instead
+            stored.to_pickle(pickle_path)
+            meta["format"] = "pickle"
+
+        # The JSON file is written last, so a half-written cache is never used
+        text = json.dumps(meta, ensure_ascii=False)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Failed to save survey cache. Reason: {e}")
+
+# This function deletes every cached survey
+def clear_survey_cache():
+    if not os.path.isdir(CACHE_DIR):
+        return
+
+    for filename in os.listdir(CACHE_DIR):
+        if filename.startswith("survey_"):
+            file_path = os.path.join(CACHE_DIR, filename)
+            try:
+                os.unlink(file_path)
+            except OSError as e:
+                print(f"Failed to delete {file_path}. Reason: {e}")
@@ -0,0 +1,120 @@
+# This file reads the survey spreadsheet only ONCE and keeps everything in memory.
+# Every other module asks this file for the answers instead of opening the .xlsx again.
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+from pandas.api.types import infer_dtype
+from config import INPUT_XLSX, CONTROL_SHEET_NAME, ANSWER_DTYPE, QTYPE_CLOSED, QTYPE_MULTIPLE
+from helpers import colnum_to_excel
+from survey_cache import load_cached_survey, save_cached_survey
+from answer_facts import build_answer_facts
+
+# This class holds the parsed answer sheet: the control map, the headers,
+# the column letters and the data frame with all the answers
+class SurveyWorkbook:
+
+    def __init__(self, df: pd.DataFrame, control_map: dict, path: str = INPUT_XLSX, sheet_name: str = CONTROL_SHEET_NAME):
+        self.path = path
+        self.sheet_name = sheet_name
+        self.df = df
+        self.control_map = control_map
+
+        # Column names and their Excel letters (A, B, C...)
+        self.headers = list(df.columns)
+        self.column_letters = {col: colnum_to_excel(i) for i, col in enumerate(self.headers)}
+
+        # The long table of answers, built the first time someone asks for it
+        self._facts = {}
+
+    # This function returns the long table of answers (see answer_facts.py), building it only once
+    def answer_facts(self, group_col_name=None):
+        if group_col_name not in self._facts:
+            self._facts[group_col_name] = build_answer_facts(self.df, self.control_map, group_col_name)
+        return self._facts[group_col_name]
+
+# This function parses the answer sheet of the Excel file
+def read_survey_workbook(path: str = INPUT_XLSX, sheet_name: str = CONTROL_SHEET_NAME) -> SurveyWorkbook:
+
+    # Open the Excel file that has all the answers
+    xls = pd.ExcelFile(path)
+
+    # If the sheet with answers isn't there, stop and shout!
+    if sheet_name not in xls.sheet_names:
+        raise ValueError(f"Sheet '{sheet_name}' not found in workbook.")
+
+    # Read the whole sheet a single time, without guessing any header or any types
+    raw = xls.parse(sheet_name, header=None, dtype=object)
+    xls.close()
+
+    # Row 1 has the question types, so we keep it aside
+    ctrl_row = raw.iloc[0].tolist() if len(raw) > 0 else []
+
+    # Build the answers table from rows 2 onwards, using row 2 as the column names.
+    # Empty cells go back to "" so pandas treats them the same way read_excel(header=1) does.
+    rows = raw.astype(object).where(raw.notna(), "").values.tolist()
+    df = TextParser(rows, header=1).read() if len(rows) > 1 else pd.DataFrame()
+
+    # Make a map that says: "This column is this kind of question"
+    control_map = {}
+    for i, col_name in enumerate(df.columns):
+
+        # Get the keyword from the control row (like FECHADA or MULTIPLA)
+        kw = ctrl_row[i] if i < len(ctrl_row) else None
+
+        # If it's empty, we say it's a closed question (FECHADA)
+        if pd.isna(kw):
+            kw = QTYPE_CLOSED
+
+        # Save the keyword in our map
+        control_map[col_name] = str(kw).strip().upper()
+
+    return SurveyWorkbook(df, control_map, path, sheet_name)
+
+# This function turns the closed and multiple choice columns that only have text
+# into a compact type ("category" or "string[pyarrow]"), to use less memory.
+# Columns with numbers are left alone, so 1, 1.0 and "1" never get mixed up.
+def compact_answer_columns(df: pd.DataFrame, control_map: dict, dtype: str) -> pd.DataFrame:
+    before = df.memory_usage(deep=True).sum()
+
+    for col in df.columns:
+        if control_map.get(col, QTYPE_CLOSED) not in (QTYPE_CLOSED, QTYPE_MULTIPLE):
+            continue
+        if df[col].dtype == object and infer_dtype(df[col], skipna=True) == "string":
+            df[col] = df[col].astype(dtype)
+
+    after = df.memory_usage(deep=True).sum()
+    print(f"Answer columns as '{dtype}': {before / 1024 / 1024:.2f} MB -> {after / 1024 / 1024:.2f} MB")
+    return df
+
+# This function loads the survey, from the on-disk cache when the file hasn't changed
+def load_survey_workbook(path: str = INPUT_XLSX, sheet_name: str = CONTROL_SHEET_NAME, use_cache: bool = True,
+                         answer_dtype=ANSWER_DTYPE) -> SurveyWorkbook:
+    survey = None
+    if use_cache:
+        cached = load_cached_survey(path, sheet_name)
+        if cached is not None:
+            print(f"Loaded '{sheet_name}' from the survey cache.")
+            df, control_map = cached
+            survey = SurveyWorkbook(df, control_map, path, sheet_name)
+
+    if survey is None:
+        survey = read_survey_workbook(path, sheet_name)
+
+        if use_cache:
+            save_cached_survey(path, sheet_name, survey.df, survey.control_map)
+
+    # The cache always keeps plain text, the compact types are only used in memory
+    if answer_dtype is not None:
+        survey = SurveyWorkbook(compact_answer_columns(survey.df, survey.control_map, answer_dtype), survey.control_map, path, sheet_name)
+
+    return survey
+
+# The workbook we already parsed, so we never read the file twice
+_survey = None
+
+# This function returns the parsed survey, reading it only the first time
+def get_survey_workbook(use_cache: bool = True, answer_dtype=ANSWER_DTYPE) -> SurveyWorkbook:
+    global _survey
+    if _survey is None:
+        _survey = load_survey_workbook(use_cache=use_cache, answer_dtype=answer_dtype)
+    return _survey
@@ -0,0 +1,308 @@
+# This file reads HUGE answer sheets row by row (openpyxl read-only mode) and keeps
+# running counts, instead of loading the whole sheet into one big table.
+# The counts come out exactly like the ones the normal (in-memory) path makes,
+# so the Excel file and the charts don't change.
+
+import itertools
+import pandas as pd
+from pandas.io.parsers import TextParser
+from config import INPUT_XLSX, CONTROL_SHEET_NAME, GROUP_BY_COL_INDEX, MULTIPLE_SEPARATOR, STREAM_CHUNK_ROWS
+from config import QTYPE_CLOSED, QTYPE_MULTIPLE, QTYPE_OPEN, QTYPE_IGNORE
+
+# Marker for an empty cell
+_BLANK = ("", "")
+
+# The data types of openpyxl cells we care about (openpyxl.cell.cell.TYPE_ERROR and TYPE_NUMERIC).
+# openpyxl itself is only imported when a sheet is streamed.
+TYPE_ERROR = "e"
+TYPE_NUMERIC = "n"
+
+# This function turns one Excel cell into a value, the same way pandas does when it reads Excel.
+# Values are kept with their type, so that 1 and True never get mixed up while counting.
+def _cell_key(cell):
+    value = cell.value
+    if value is None or cell.data_type == TYPE_ERROR:
+        return _BLANK
+    if cell.data_type == TYPE_NUMERIC:
+        as_int = int(value)
+        value = as_int if as_int == value else float(value)
+    if isinstance(value, str) and value == "":
+        return _BLANK
+    return (type(value), value)
+
+# This function turns the values we saw in a column into what pandas would have made of them.
+# pandas picks the type of a column (numbers, text...) looking at all its values,
+# so we show it every distinct value once, plus an empty cell if the column had any.
+def _convert_column(raw_keys: list, has_blank: bool):
+    rows = [[key[1]] for key in raw_keys]
+    if has_blank:
+        rows.append([""])
+
+    if not rows:
+        return {}, pd.Series(dtype=float)
+
+    converted = TextParser(rows, header=None, skip_blank_lines=False).read()[0]
+    return dict(zip(raw_keys, converted.tolist())), converted
+
+# This class keeps the running counts of the answers, chunk after chunk
+class StreamingCounter:
+
+    def __init__(self, control_types: list, group_col_index=None):
+        self.control_types = control_types
+        self.group_col_index = group_col_index
+
+        # For each column: {(group cell, answer cell): how many rows}
+        self.pairs = {}
+
+        # For each column: how many cells were NOT empty
+        self.filled = {}
+
+        # The group cells in the order we first saw them, and how many rows had each
+        self.group_keys = {}
+
+        # How many data rows we saw (and how many empty rows are waiting at the end)
+        self.n_rows = 0
+        self.pending_blank_rows = 0
+        self.width = 0
+
+    # This function tells if we need to count a column
+    def _is_counted(self, i):
+        kw = self.control_types[i] if i < len(self.control_types) else QTYPE_CLOSED
+        return kw not in (QTYPE_IGNORE, QTYPE_OPEN)
+
+    # This function adds a chunk of rows to the counts
+    def add_rows(self, rows):
+        gi = self.group_col_index
+
+        for keys in rows:
+            # Drop the empty cells at the end of the row
+            while keys and keys[-1] == _BLANK:
+                keys.pop()
+
+            # Empty rows only count if something comes after them
+            if not keys:
+                self.pending_blank_rows += 1
+                continue
+            if self.pending_blank_rows:
+                self.n_rows += self.pending_blank_rows
+                if gi is not None:
+                    self.group_keys[_BLANK] = self.group_keys.get(_BLANK, 0) + self.pending_blank_rows
+                self.pending_blank_rows = 0
+
+            self.n_rows += 1
+            self.width = max(self.width, len(keys))
+
+            gkey = _BLANK
+            if gi is not None:
+                gkey = keys[gi] if gi < len(keys) else _BLANK
+                self.group_keys[gkey] = self.group_keys.get(gkey, 0) + 1
+
+            for i, key in enumerate(keys):
+                if key == _BLANK:
+                    continue
+                self.filled[i] = self.filled.get(i, 0) + 1
+
+                if self._is_counted(i):
+                    pairs = self.pairs.setdefault(i, {})
+                    pairs[(gkey, key)] = pairs.get((gkey, key), 0) + 1
+
+    # This function tells if a column had at least one empty cell
+    def _has_blank(self, i):
+        return self.filled.get(i, 0) < self.n_rows
+
+    # This function turns the counts of one column into answer tallies, per group.
+    # group_of maps each group cell to the group it belongs to.
+    def _column_tallies(self, i, multiple: bool, group_of: dict, group_is_text: bool):
+        pairs = self.pairs.get(i, {})
+        own_group_col = group_is_text and i == self.group_col_index
+
+        # Convert every distinct cell once
+        raw_keys = list(dict.fromkeys(key for _, key in pairs))
+        converted, _ = _convert_column(raw_keys, self._has_blank(i))
+
+        general = _Tally()
+        by_group = {}
+        for (gkey, key), n in pairs.items():
+            answers = _answers_of(converted[key], multiple)
+            general.add(answers, n)
+            if gkey in group_of and not own_group_col:
+                by_group.setdefault(group_of[gkey], _Tally()).add(answers, n)
+
+        # main.py turns a text group column into clean strings before splitting the groups,
+        # so inside each group that column is counted from the cleaned names
+        if own_group_col:
+            for gkey, n in self.group_keys.items():
+                if gkey in group_of:
+                    group = group_of[gkey]
+                    by_group.setdefault(group, _Tally()).add(_answers_of(group, multiple), n)
+
+        return general, by_group
+
+    # This function works out the groups exactly like main.py does with the full table
+    def _groups(self):
+        if self.group_col_index is None:
+            return {}, [], False
+
+        gi = self.group_col_index
+        raw_keys = [k for k in self.group_keys if k != _BLANK]
+        converted, column = _convert_column(raw_keys, self._has_blank(gi))
+
+        group_of = {}
+        order = {}
+        is_text = column.dtype == object
+        for key in self.group_keys:
+            value = converted.get(key, float("nan"))
+
+            # Text columns get cleaned (empty cells become "nan"); others drop the empty ones
+            if is_text:
+                value = str(value).strip()
+                if value == "":
+                    continue
+            elif pd.isna(value):
+                continue
+
+            group_of[key] = value
+            order.setdefault(value, None)
+
+        return group_of, list(order), is_text
+
+    # This function gives back the final counts: one Series per column for everyone,
+    # and the same per group
+    def result(self, control_map: dict, columns: list):
+        group_of, groups, group_is_text = self._groups()
+
+        # How many rows each group has
+        group_rows = {g: 0 for g in groups}
+        for gkey, n in self.group_keys.items():
+            if gkey in group_of:
+                group_rows[group_of[gkey]] += n
+
+        general = {}
+        by_group = {g: {} for g in groups}
+        for i, col in enumerate(columns):
+            ctrl_kw = control_map.get(col, QTYPE_CLOSED)
+            if ctrl_kw in (QTYPE_IGNORE, QTYPE_OPEN):
+                continue
+
+            multiple = ctrl_kw == QTYPE_MULTIPLE
+            col_general, col_by_group = self._column_tallies(i, multiple, group_of, group_is_text)
+            general[col] = col_general.to_counts(self.n_rows, multiple)
+            for g in groups:
+                by_group[g][col] = col_by_group.get(g, _Tally()).to_counts(group_rows[g], multiple)
+
+        return general, by_group
+
+# This class holds the counts of one question inside one sheet (everyone, or one group)
+class _Tally:
+
+    def __init__(self):
+        self.counts = {}
+
+        # How many rows had at least one valid answer
+        self.answered = 0
+
+    # This function adds the answers found in n rows with the same cell
+    def add(self, answers: list, n: int):
+        if answers:
+            self.answered += n
+        for answer in answers:
+            self.counts[answer] = self.counts.get(answer, 0) + n
+
+    # This function turns the tally into a Series sorted like value_counts() does
+    def to_counts(self, n_rows: int, multiple: bool) -> pd.Series:
+        counts = self.counts
+        if not counts:
+            return pd.Series(dtype="int64")
+
+        # clean_single goes through Series.apply, which picks a new type for the cleaned answers
+        # (e.g. whole numbers become 1.0 when some rows are empty), so we do the same here
+        if not multiple:
+            probe = list(counts) + ([None] if self.answered < n_rows else [])
+            converted = pd.Series(probe, dtype=object).apply(lambda x: x).tolist()
+            counts = dict(zip(converted, counts.values()))
+
+        return pd.Series(counts, dtype="int64").sort_values(ascending=False)
+
+# This function splits one cell into the answers we count, with the same rules
+# as clean_single (closed questions) and expand_multiple (multiple choice)
+def _answers_of(value, multiple: bool) -> list:
+    if pd.isna(value):
+        return []
+
+    if isinstance(value, str):
+        if multiple:
+            parts = [p.strip() for p in value.split(MULTIPLE_SEPARATOR)]
+            return [p for p in parts if p != ""]
+        return [value.strip()] if value.strip() != "" else []
+
+    return [value]
+
+# This class holds everything the streaming read found
+class StreamedSurvey:
+
+    def __init__(self, headers: list, control_map: dict, general_counts: dict, group_counts: dict, groups: list, group_col_name=None):
+        self.headers = headers
+        self.control_map = control_map
+        self.general_counts = general_counts
+        self.group_counts = group_counts
+        self.groups = groups
+        self.group_col_name = group_col_name
+
+# This function reads the answer sheet chunk by chunk and counts the answers.
+# Only one chunk of rows is in memory at a time.
+def stream_survey_counts(path: str = INPUT_XLSX, sheet_name: str = CONTROL_SHEET_NAME,
+                         group_col_index=GROUP_BY_COL_INDEX, chunk_rows: int = STREAM_CHUNK_ROWS) -> StreamedSurvey:
+
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        # If the sheet with answers isn't there, stop and shout!
+        if sheet_name not in wb.sheetnames:
+            raise ValueError(f"Sheet '{sheet_name}' not found in workbook.")
+
+        ws = wb[sheet_name]
+        ws.reset_dimensions()
+        rows = (list(map(_cell_key, row)) for row in ws.iter_rows())
+
+        # Row 1 has the question types, row 2 the column names
+        ctrl_keys = next(rows, [])
+        header_keys = next(rows, [])
+        control_types = []
+        for key in ctrl_keys:
+            kw = QTYPE_CLOSED if key == _BLANK else key[1]
+            control_types.append(str(kw).strip().upper())
+
+        counter = StreamingCounter(control_types, group_col_index)
+
+        # Go through the answers one chunk at a time
+        while True:
+            chunk = list(itertools.islice(rows, chunk_rows))
+            if not chunk:
+                break
+            counter.add_rows(chunk)
+    finally:
+        wb.close()
+
+    # Column names, cleaned up by pandas (e.g. "Unnamed: 3", "Question.1")
+    while ctrl_keys and ctrl_keys[-1] == _BLANK:
+        ctrl_keys.pop()
+    while header_keys and header_keys[-1] == _BLANK:
+        header_keys.pop()
+    width = max(counter.width, len(ctrl_keys), len(header_keys))
+    header_row = [key[1] for key in header_keys] + [""] * (width - len(header_keys))
+    headers = list(TextParser([header_row], header=0).read().columns) if width else []
+
+    # Make a map that says: "This column is this kind of question"
+    control_map = {}
+    for i, col_name in enumerate(headers):
+        control_map[col_name] = control_types[i] if i < len(control_types) else QTYPE_CLOSED
+
+    # Make sure the group column index is not too big
+    group_col_name = None
+    if group_col_index is not None:
+        if group_col_index >= len(headers):
+            raise IndexError(f"GROUP_BY_COL_INDEX {group_col_index} out of range for sheet '{sheet_name}'")
+        group_col_name = headers[group_col_index]
+
+    general_counts, group_counts = counter.result(control_map, headers)
+    return StreamedSurvey(headers, control_map, general_counts, group_counts, list(group_counts), group_col_name)